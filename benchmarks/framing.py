@@ -0,0 +1,198 @@
+'''
+micro-benchmarks of framing and codec hot paths, no network needed (receive paths read from a socketpair)
+run from repository root:
+    python -m benchmarks.framing --output bench.json
+    python -m benchmarks.framing --baseline bench.json --threshold 0.15
+every benchmark reports ns per message and, where payload size matters, MB/s of payload
+with --baseline, exits with status 1 if any benchmark got slower than baseline by more than threshold
+'''
+from argparse import ArgumentParser
+from threading import Thread
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import platform
+import socket
+import sys
+import time
+
+from socket_frame.constants import HeaderTypeEnum
+from socket_frame.header import (
+    get_message_length_from_header, make_header_bytestr_delimiter_terminated, make_header_bytestr_fixed_length,
+)
+from socket_frame.message_create import make_message
+from socket_frame.message_parse import parse_message
+from socket_frame.ndarray_payload import np
+from socket_frame.settings import TcpSettings
+from socket_frame.worker import GeneratorWorker, Worker
+
+
+PAYLOAD_SIZES = {
+    '10B': 10,
+    '1KB': 1024,
+    '64KB': 64 * 1024,
+    '1MB': 1024 * 1024,
+    '16MB': 16 * 1024 * 1024,
+    '64MB': 64 * 1024 * 1024,
+}
+
+# calibration stops doubling iterations here even if min time is not reached yet
+MAX_ITERATIONS = 1 << 20
+
+
+def _measure(run_batch: Callable[[int], None], min_time: float) -> Tuple[float, int]:
+    '''returns ns per operation and number of operations of the batch it was measured on'''
+    run_batch(1)  # warm up
+    iterations = 1
+    while True:
+        started = perf_counter_ns()
+        run_batch(iterations)
+        elapsed = perf_counter_ns() - started
+        if elapsed >= min_time * 1e9 or iterations >= MAX_ITERATIONS:
+            return elapsed / iterations, iterations
+        iterations *= 2
+
+
+def _repeat(func: Callable[[], Any]) -> Callable[[int], None]:
+    def run_batch(iterations: int) -> None:
+        for _ in range(iterations):
+            func()
+    return run_batch
+
+
+def _send_repeatedly(conn: socket.socket, message: bytes, iterations: int) -> None:
+    for _ in range(iterations):
+        conn.sendall(message)
+
+
+def _receive_with_worker(worker: Worker) -> None:
+    worker.get_next_message()
+
+
+def _receive_with_generator_worker(worker: GeneratorWorker) -> None:
+    for _ in worker.get_next_message():
+        pass
+    worker.get_message_and_clear()
+
+
+def _receive_from_socketpair(worker_cls: type, receive: Callable, message: bytes, settings: TcpSettings) -> Callable[[int], None]:
+    def run_batch(iterations: int) -> None:
+        reader, writer = socket.socketpair()
+        sender = Thread(target=_send_repeatedly, args=(writer, message, iterations), daemon=True)
+        sender.start()
+        worker = worker_cls(reader, settings=settings)
+        for _ in range(iterations):
+            receive(worker)
+        sender.join()
+        reader.close()
+        writer.close()
+    return run_batch
+
+
+def _payload_of(message: bytes, settings: TcpSettings) -> bytearray:
+    '''payload as workers pass it to parse_message'''
+    if settings.HEADER_TYPE is HeaderTypeEnum.FIXED_LENGTH:
+        return bytearray(message[settings.HEADER_LENGTH:])
+    termination_sequence_bytes = settings.HEADER_TERMINATION_SEQUENCE.encode(settings.MSG_FORMAT)
+    return bytearray(message.split(termination_sequence_bytes, 1)[1])
+
+
+def _make_payloads(size: int) -> Dict[str, Any]:
+    # json string of size bytes once encoded (two quotes included)
+    payloads = {'json': 'x' * max(size - 2, 0)}
+    if np is not None:
+        payloads['ndarray'] = np.zeros(size, dtype=np.uint8)
+    return payloads
+
+
+def _result(ns_per_message: float, iterations: int, payload_bytes: Optional[int] = None) -> Dict[str, Any]:
+    result = {'ns_per_message': round(ns_per_message, 1), 'iterations': iterations}
+    if payload_bytes is not None:
+        result['mb_per_s'] = round(payload_bytes / ns_per_message * 1e3, 2)
+    return result
+
+
+def run_benchmarks(sizes: List[str], min_time: float) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for header_type in HeaderTypeEnum:
+        settings = TcpSettings(server_address='127.0.0.1', header_type=header_type)
+        prefix = header_type.value
+
+        # workers hand header to get_message_length_from_header without termination sequence
+        if header_type is HeaderTypeEnum.DELIMITER_TERMINATED:
+            make_header_func = make_header_bytestr_delimiter_terminated
+            header = str(1024).encode(settings.MSG_FORMAT)
+        else:
+            make_header_func = make_header_bytestr_fixed_length
+            header = make_header_bytestr_fixed_length(1024, settings)
+        results[f'{prefix}/{make_header_func.__name__}'] = _result(
+            *_measure(_repeat(lambda: make_header_func(1024, settings)), min_time))
+        results[f'{prefix}/get_message_length_from_header'] = _result(
+            *_measure(_repeat(lambda: get_message_length_from_header(header, settings)), min_time))
+
+        for size_name in sizes:
+            for payload_kind, payload in _make_payloads(PAYLOAD_SIZES[size_name]).items():
+                name = f'{prefix}/{payload_kind}/{size_name}'
+                message = make_message(payload, settings)
+                payload_bytes = _payload_of(message, settings)
+
+                results[f'{name}/make_message'] = _result(
+                    *_measure(_repeat(lambda: make_message(payload, settings)), min_time), len(payload_bytes))
+                results[f'{name}/parse_message'] = _result(
+                    *_measure(_repeat(lambda: parse_message(payload_bytes, settings)), min_time), len(payload_bytes))
+                results[f'{name}/worker_receive'] = _result(
+                    *_measure(_receive_from_socketpair(Worker, _receive_with_worker, message, settings), min_time),
+                    len(payload_bytes))
+                results[f'{name}/generator_worker_receive'] = _result(
+                    *_measure(_receive_from_socketpair(
+                        GeneratorWorker, _receive_with_generator_worker, message, settings), min_time),
+                    len(payload_bytes))
+                print(f'{name} done', file=sys.stderr)
+    return results
+
+
+def find_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['ns_per_message']
+        after = result['ns_per_message']
+        if after > before * (1 + threshold):
+            regressions.append(f'{name}: {before} -> {after} ns per message (+{(after / before - 1) * 100:.1f}%)')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='framing and codec micro-benchmarks')
+    parser.add_argument('--sizes', nargs='+', choices=list(PAYLOAD_SIZES), default=list(PAYLOAD_SIZES))
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent on every benchmark at least')
+    parser.add_argument('--output', help='write results as json to this file')
+    parser.add_argument('--baseline', help='json written earlier by --output to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown, 0.1 means 10%%')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__ if np is not None else None,
+            'min_time': args.min_time,
+        },
+        'results': run_benchmarks(args.sizes, args.min_time),
+    }
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report_json)
+    else:
+        print(report_json)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = find_regressions(report['results'], baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        sys.exit(1 if regressions else 0)
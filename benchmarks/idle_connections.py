@@ -0,0 +1,69 @@
+'''
+python heap bytes held per idle connection of a generator based server
+run from repository root: python -m benchmarks.idle_connections --connections 10000
+idle connection is a GeneratorWorker + bound echo handler + its task parked on reading the next header
+socket objects are created before measuring and kernel socket buffers are not python heap, both are not counted
+'''
+from argparse import ArgumentParser
+import gc
+import json
+import resource
+import socket
+import tracemalloc
+
+from socket_frame.buffer_pool import BufferPool
+from socket_frame.handler import run_echo_async
+from socket_frame.settings import TcpSettings
+from socket_frame.worker import GeneratorWorker
+
+
+def _allowed_connections(requested: int) -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        soft = hard
+    # every connection is a socketpair, keep some descriptors spare
+    return min(requested, (soft - 64) // 2)
+
+
+def measure_idle_connections(connections: int, settings: TcpSettings) -> dict:
+    socket_pairs = [socket.socketpair() for _ in range(connections)]
+    for server_side, _ in socket_pairs:
+        server_side.setblocking(False)
+    buffer_pool = BufferPool(settings.BYTES_CHUNK_SIZE)
+    tasks = {}
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for server_side, _ in socket_pairs:
+        worker = GeneratorWorker(server_side, settings=settings, buffer_pool=buffer_pool)
+        task = run_echo_async(worker, settings=settings)
+        # parks the task on EWOULDBLOCK while reading header, as it is for a silent client
+        next(task)
+        tasks[server_side.fileno()] = task
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    for server_side, client_side in socket_pairs:
+        server_side.close()
+        client_side.close()
+    return {
+        'connections': connections,
+        'bytes_per_idle_connection': round((after - before) / connections, 1),
+        'peak_bytes_per_connection': round((peak - before) / connections, 1),
+        'pooled_buffers': buffer_pool.pooled_count,
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='python heap bytes per idle connection')
+    parser.add_argument('--connections', type=int, default=1000)
+    args = parser.parse_args()
+
+    connections = _allowed_connections(args.connections)
+    if connections < args.connections:
+        print(f'open files limit allows only {connections} connections')
+    settings = TcpSettings(server_address='127.0.0.1')
+    print(json.dumps(measure_idle_connections(connections, settings), indent=2))
@@ -0,0 +1,17 @@
+from logging import basicConfig, DEBUG, getLogger
+
+from socket_frame.datagram import DatagramClient
+from socket_frame.settings import TcpSettings
+
+
+basicConfig()
+logger = getLogger(__name__)
+logger.setLevel(DEBUG)
+
+if __name__ == '__main__':
+    settings = TcpSettings()
+    client = DatagramClient(settings=settings)
+    client.send({'metric': 'whatever', 'value': 1})
+    response = client.receive_one_msg()
+    logger.info(response)
+    client.close()
@@ -0,0 +1,16 @@
+from logging import basicConfig, getLogger, INFO
+
+from socket_frame.datagram import DatagramServer
+from socket_frame.handler import run_echo
+from socket_frame.settings import TcpSettings
+
+
+basicConfig()
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+
+
+if __name__ == '__main__':
+    settings = TcpSettings()
+    server = DatagramServer(settings, core_handler=run_echo)
+    server.run()
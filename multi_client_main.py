@@ -0,0 +1,19 @@
+from logging import basicConfig, DEBUG, getLogger
+
+from socket_frame.client import MultiClient
+from socket_frame.settings import TcpSettings
+
+
+basicConfig()
+logger = getLogger(__name__)
+logger.setLevel(DEBUG)
+
+if __name__ == '__main__':
+    settings = TcpSettings()
+    targets = [(settings.SERVER_ADDRESS, settings.PORT), (settings.SERVER_ADDRESS, settings.PORT + 1)]
+    client = MultiClient(targets, settings=settings)
+    with client.connect() as connected_client:
+        responses = connected_client.broadcast('whatever', timeout=1)
+        logger.info(responses)
+        responses_2 = connected_client.scatter({target: {'shard': i} for i, target in enumerate(targets)}, timeout=1)
+        logger.info(responses_2)
@@ -0,0 +1,24 @@
+from argparse import ArgumentParser
+from logging import basicConfig, getLogger, INFO
+
+from socket_frame.replay import replay
+from socket_frame.settings import TcpSettings
+
+
+basicConfig()
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='replay traffic captured by TrafficRecorder against a running server')
+    parser.add_argument('recording', help='path to the jsonl recording')
+    parser.add_argument('--speed', type=float, default=1.0, help='rate multiplier, 1.0 keeps original timing')
+    parser.add_argument('--as-fast-as-possible', action='store_true', help='ignore recorded timing')
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error('--speed has to be positive, use --as-fast-as-possible to ignore recorded timing')
+
+    settings = TcpSettings()
+    stats = replay(args.recording, settings, speed=None if args.as_fast_as_possible else args.speed)
+    logger.info(stats)
@@ -0,0 +1,118 @@
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional, Tuple
+import socket
+
+from .message_create import make_message
+from .queue_stats import QueueStats
+from .settings import TcpSettings
+
+
+logger = getLogger(__name__)
+
+
+class TokenBucket():
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = monotonic()
+
+    def refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self) -> bool:
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class AdmissionController():
+    '''
+    decides at accept time whether a new connection is served or gets a short framed busy reply and is closed
+    limits (all optional, see TcpSettings): connections cap, accept rate, per client ip rate,
+    depth of the server work queue and how long its oldest item has been waiting
+    every admitted connection has to be released once it is finished
+    '''
+    # per client buckets are pruned once there are more of them, only fully refilled ones are dropped
+    MAX_TRACKED_CLIENTS = 4096
+
+    def __init__(self, settings: TcpSettings, queue_stats: Optional[QueueStats] = None):
+        self.settings = settings
+        self.queue_stats = queue_stats
+        self.active_connections = 0
+        self.rejected_connections = 0
+        self._accept_bucket = None
+        if settings.ACCEPT_RATE_LIMIT is not None:
+            self._accept_bucket = TokenBucket(settings.ACCEPT_RATE_LIMIT, settings.ACCEPT_BURST)
+        self._client_buckets: Dict[str, TokenBucket] = {}
+        self._busy_frame = make_message(settings.BUSY_MESSAGE, settings)
+        self._lock = Lock()
+
+    def admit(self, address: Tuple[str, int]) -> bool:
+        with self._lock:
+            admitted = self._check(address[0])
+            if admitted:
+                self.active_connections += 1
+            else:
+                self.rejected_connections += 1
+        return admitted
+
+    def release(self) -> None:
+        with self._lock:
+            self.active_connections -= 1
+
+    def reject(self, conn: socket.socket) -> None:
+        # busy frame fits into an empty send buffer, never wait for a client while overloaded
+        conn.setblocking(False)
+        try:
+            conn.send(self._busy_frame)
+        except OSError:
+            pass
+        conn.close()
+
+    def _check(self, client_ip: str) -> bool:
+        settings = self.settings
+        if settings.MAX_CONNECTIONS is not None and self.active_connections >= settings.MAX_CONNECTIONS:
+            logger.debug('rejecting %s: connections limit', client_ip)
+            return False
+        if self.queue_stats is not None and self._queue_is_overloaded():
+            logger.debug('rejecting %s: work queue watermark', client_ip)
+            return False
+        if self._accept_bucket is not None and not self._accept_bucket.take():
+            logger.debug('rejecting %s: accept rate limit', client_ip)
+            return False
+        if settings.PER_CLIENT_RATE_LIMIT is not None and not self._client_bucket(client_ip).take():
+            logger.debug('rejecting %s: client rate limit', client_ip)
+            return False
+        return True
+
+    def _queue_is_overloaded(self) -> bool:
+        settings = self.settings
+        depth = self.queue_stats.depth
+        if settings.MAX_QUEUE_DEPTH is not None and depth > settings.MAX_QUEUE_DEPTH:
+            return True
+        # smoothed latency only changes when items start, waiting time of the oldest item keeps growing while none do
+        if settings.MAX_QUEUE_LATENCY is not None and self.queue_stats.oldest_wait() > settings.MAX_QUEUE_LATENCY:
+            return True
+        return False
+
+    def _client_bucket(self, client_ip: str) -> TokenBucket:
+        bucket = self._client_buckets.get(client_ip)
+        if bucket is None:
+            if len(self._client_buckets) >= self.MAX_TRACKED_CLIENTS:
+                self._prune_client_buckets()
+            bucket = TokenBucket(self.settings.PER_CLIENT_RATE_LIMIT, self.settings.PER_CLIENT_BURST)
+            self._client_buckets[client_ip] = bucket
+        return bucket
+
+    def _prune_client_buckets(self) -> None:
+        for client_ip, bucket in list(self._client_buckets.items()):
+            bucket.refill()
+            if bucket.tokens >= bucket.capacity:
+                del self._client_buckets[client_ip]
@@ -0,0 +1,33 @@
+from typing import Dict, List, Optional
+
+
+class BufferPool():
+    '''
+    reusable receive buffers shared by all connections of a server, kept per size
+    (chunk sized buffers for delimiter terminated headers, header sized ones for fixed length headers)
+    a buffer is lent only while a header is being received, so idle connections hold no buffer at all
+    acquire/release rely on atomic dict.setdefault, list.pop and list.append, so one pool can be shared by threads
+    '''
+    __slots__ = ('buffer_size', 'max_pooled', '_free')
+
+    def __init__(self, buffer_size: int, max_pooled: int = 64):
+        self.buffer_size = buffer_size
+        self.max_pooled = max_pooled
+        self._free: Dict[int, List[bytearray]] = {}
+
+    @property
+    def pooled_count(self) -> int:
+        '''number of buffers waiting in the pool, of all sizes'''
+        return sum(len(free) for free in list(self._free.values()))
+
+    def acquire(self, size: Optional[int] = None) -> bytearray:
+        size = self.buffer_size if size is None else size
+        try:
+            return self._free.setdefault(size, []).pop()
+        except IndexError:
+            return bytearray(size)
+
+    def release(self, buffer: bytearray) -> None:
+        free = self._free.setdefault(len(buffer), [])
+        if len(free) < self.max_pooled:
+            free.append(buffer)
@@ -1,11 +1,16 @@
 from contextlib import contextmanager
 from logging import getLogger
-from typing import Any
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from time import monotonic
+from typing import Any, Dict, Generator, Iterable, Optional, Tuple
+import errno
 import socket
 
-from .exceptions import CallingMethodForNonConnectedClient
+from .buffer_pool import BufferPool
+from .constants import CurrentOperationEnum
+from .exceptions import CallingMethodForNonConnectedClient, MessageExceedsMaxSize, SocketIsClosed, UnexpectedSocketError
 from .settings import TcpSettings
-from .worker import Worker
+from .worker import GeneratorWorker, Worker
 
 
 logger = getLogger(__name__)
@@ -50,4 +55,137 @@ class Client(Worker):
         if self.worker is None:
             raise CallingMethodForNonConnectedClient
         return self.worker.get_next_message()
-        
+
+
+Target = Tuple[str, int]
+
+
+class MultiClient():
+    '''
+    drives connections to many servers from a single thread: nonblocking sockets, GeneratorWorker framing, one selector
+    connections are opened lazily by scatter and kept between calls; a target which fails or misses the deadline
+    is disconnected (its framing state is unknown) and reconnected on next call
+    '''
+    def __init__(self, targets: Iterable[Target], *, settings: TcpSettings):
+        self.targets = list(targets)
+        self.settings = settings
+        self._selector: Optional[DefaultSelector] = None
+        self._workers: Dict[Target, GeneratorWorker] = {}
+        self._buffer_pool = BufferPool(settings.BYTES_CHUNK_SIZE)
+
+    @contextmanager
+    def connect(self):
+        self._selector = DefaultSelector()
+        try:
+            yield self
+        finally:
+            for target in list(self._workers):
+                self._drop(target)
+            self._selector.close()
+            self._selector = None
+
+    def broadcast(self, msg: Any, *, timeout: Optional[float] = None) -> Dict[Target, Any]:
+        return self.scatter({target: msg for target in self.targets}, timeout=timeout)
+
+    def scatter(self, msgs: Dict[Target, Any], *, timeout: Optional[float] = None) -> Dict[Target, Any]:
+        '''
+        sends msgs[target] to every target and gathers one response from each
+        returns responses of targets which answered before the deadline, so on timeout result is partial
+        '''
+        if self._selector is None:
+            raise CallingMethodForNonConnectedClient
+        if timeout is None:
+            timeout = self.settings.SOCKET_TIMEOUT
+        deadline = monotonic() + timeout
+        results = {}
+        exchanges: Dict[Target, Optional[Generator]] = {}
+        for target, msg in msgs.items():
+            if target in self._workers:
+                self._selector.register(self._workers[target].conn, EVENT_READ, target)
+                exchanges[target] = self._exchange(target, msg)
+            elif self._open(target):
+                # request is sent once nonblocking connect is done
+                exchanges[target] = None
+
+        for target in list(exchanges):
+            if exchanges[target] is not None:
+                self._advance(target, exchanges, results)
+
+        while exchanges:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in self._selector.select(remaining):
+                target = key.data
+                if target not in exchanges:
+                    continue
+                if exchanges[target] is None:
+                    if not self._finish_connect(target):
+                        del exchanges[target]
+                        continue
+                    exchanges[target] = self._exchange(target, msgs[target])
+                self._advance(target, exchanges, results)
+
+        for target in exchanges:
+            logger.warning('no response from %s before deadline', target)
+            self._drop(target)
+        return results
+
+    def _open(self, target: Target) -> bool:
+        conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        conn.setblocking(False)
+        error_code = conn.connect_ex(target)
+        if error_code not in (0, errno.EINPROGRESS):
+            logger.warning('could not connect to %s: %s', target, errno.errorcode.get(error_code, error_code))
+            conn.close()
+            return False
+        self._workers[target] = GeneratorWorker(conn, settings=self.settings, buffer_pool=self._buffer_pool)
+        self._selector.register(conn, EVENT_WRITE, target)
+        return True
+
+    def _finish_connect(self, target: Target) -> bool:
+        conn = self._workers[target].conn
+        error_code = conn.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error_code:
+            logger.warning('could not connect to %s: %s', target, errno.errorcode.get(error_code, error_code))
+            self._drop(target)
+            return False
+        return True
+
+    def _exchange(self, target: Target, msg: Any) -> Generator:
+        worker = self._workers[target]
+        yield from worker.send_message(msg)
+        yield from worker.get_next_message()
+        return worker.get_message_and_clear()
+
+    def _advance(self, target: Target, exchanges: Dict[Target, Optional[Generator]], results: Dict[Target, Any]) -> None:
+        '''steps exchange until its socket would block, then waits for the event it is blocked on'''
+        worker = self._workers[target]
+        exchange = exchanges[target]
+        try:
+            while True:
+                moved_before = worker.bytes_received + worker.bytes_sent
+                next(exchange)
+                if worker.bytes_received + worker.bytes_sent == moved_before:
+                    break
+        except StopIteration as finished:
+            results[target] = finished.value
+            del exchanges[target]
+            # idle connections are not watched, so their events cannot wake up other scatter calls
+            self._selector.unregister(worker.conn)
+            return
+        except (SocketIsClosed, UnexpectedSocketError, ConnectionError, MessageExceedsMaxSize) as e:
+            logger.warning('connection to %s failed: %s', target, e)
+            del exchanges[target]
+            self._drop(target)
+            return
+        events = EVENT_WRITE if worker.current_operation is CurrentOperationEnum.WRITING else EVENT_READ
+        self._selector.modify(worker.conn, events, target)
+
+    def _drop(self, target: Target) -> None:
+        worker = self._workers.pop(target)
+        try:
+            self._selector.unregister(worker.conn)
+        except KeyError:
+            pass
+        worker.conn.close()
@@ -17,4 +17,7 @@ class CurrentOperationEnum(Enum):
     READING = 'reading'
 
 
-STOP_DAEMON_THREAD_EVENT_LOOP_TASK_STR = 'STOP'
\ No newline at end of file
+STOP_DAEMON_THREAD_EVENT_LOOP_TASK_STR = 'STOP'
+
+# first payload byte of ndarray frames, json payload never starts with it
+NDARRAY_PAYLOAD_MARKER = b'\x00'
@@ -0,0 +1,176 @@
+from inspect import isgenerator
+from logging import getLogger
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+import select
+import socket
+
+from .constants import HeaderTypeEnum
+from .exceptions import (
+    CoreHandlerNotSpecified, MalformedDatagram, MessageExceedsDatagramCapacity, OnMessageEffectNotSet,
+)
+from .header import get_message_length_from_header
+from .message_create import make_message_parts
+from .message_parse import parse_message
+from .settings import TcpSettings
+
+
+logger = getLogger(__name__)
+
+
+Address = Tuple[str, int]
+
+
+def _send_datagram(conn: socket.socket, msg: Any, address: Address, settings: TcpSettings) -> None:
+    message_parts = make_message_parts(msg, settings)
+    if sum(len(part) for part in message_parts) > settings.MAX_DATAGRAM_SIZE:
+        raise MessageExceedsDatagramCapacity
+    # parts are gathered by kernel, ndarray data is not copied into a joined message
+    conn.sendmsg(message_parts, [], 0, address)
+
+
+def _parse_datagram(buffer: bytearray, length: int, settings: TcpSettings) -> Any:
+    '''datagram is a complete message as produced by make_message: header, then payload'''
+    if settings.HEADER_TYPE is HeaderTypeEnum.FIXED_LENGTH:
+        header_end = payload_start = settings.HEADER_LENGTH
+        if header_end > length:
+            raise MalformedDatagram('datagram is shorter than header')
+    elif settings.HEADER_TYPE is HeaderTypeEnum.DELIMITER_TERMINATED:
+        termination_sequence_bytes = settings.HEADER_TERMINATION_SEQUENCE.encode(settings.MSG_FORMAT)
+        header_end = buffer.find(termination_sequence_bytes, 0, length)
+        if header_end == -1:
+            raise MalformedDatagram('no header termination sequence')
+        payload_start = header_end + len(termination_sequence_bytes)
+    else:
+        raise NotImplementedError
+    try:
+        msg_length = get_message_length_from_header(bytes(buffer[:header_end]), settings=settings)
+    except ValueError as e:
+        raise MalformedDatagram(e)
+    if payload_start + msg_length != length:
+        raise MalformedDatagram(f'header announces {msg_length} payload bytes, datagram has {length - payload_start}')
+    # copied out of the reusable receive buffer, parsed ndarray keeps its own memory
+    return parse_message(bytearray(memoryview(buffer)[payload_start:length]), settings)
+
+
+class DatagramWorker():
+    '''
+    worker for a udp socket: one message per datagram, reply goes to sender of the datagram being handled
+    single instance serves every peer, so there is no per-connection state at all
+    works with synchronous and generator handlers: datagrams are sent at once, so a generator handler is run to the end
+    '''
+    __slots__ = ('conn', 'settings', 'peer', '_on_message')
+
+    def __init__(self, connection: socket.socket, settings: TcpSettings):
+        self.conn = connection
+        self.settings = settings
+        self.peer: Optional[Address] = None
+        self._on_message = None
+
+    def send_message(self, msg: Any) -> Iterable:
+        '''method which can be called only by related handler'''
+        _send_datagram(self.conn, msg, self.peer, self.settings)
+        # already sent, nothing to wait for: generator handlers can still `yield from` it
+        return ()
+
+    def on_message(self, msg: Any, peer: Address) -> None:
+        if self._on_message is None:
+            raise OnMessageEffectNotSet
+        self.peer = peer
+        try:
+            result = self._on_message(msg)
+            if isgenerator(result):
+                for _ in result:
+                    pass
+        finally:
+            self.peer = None
+
+    def run(self) -> None:
+        # DatagramServer feeds datagrams to on_message, there is no per-connection loop to run
+        pass
+
+    def set_on_connect(self, effect_from_handler: Callable) -> None:
+        # there are no connections in udp mode, kept for handler compatibility
+        pass
+
+    def set_on_message(self, effect_from_handler: Callable) -> None:
+        self._on_message = effect_from_handler
+
+
+class DatagramServer():
+    '''
+    udp counterpart of servers, core_handler (e.g. run_echo or run_echo_async) binds its handler once
+    to the single DatagramWorker
+    datagrams are drained in batches into preallocated buffers (python has no recvmmsg, so it is a recvfrom_into loop
+    on a nonblocking socket after select reports it readable), then handled one by one
+    '''
+    def __init__(self, settings: TcpSettings, core_handler=None):
+        self.settings = settings
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.setblocking(0)
+        self.server.bind((settings.SERVER_ADDRESS, settings.PORT))
+        if core_handler:
+            self.default_handler = core_handler
+        else:
+            raise CoreHandlerNotSpecified
+        self.worker = DatagramWorker(self.server, settings)
+        self.default_handler(self.worker, settings=settings)
+        self._buffers = [bytearray(settings.MAX_DATAGRAM_SIZE) for _ in range(settings.DATAGRAM_BATCH_SIZE)]
+        self._batch: List[Tuple[int, Address]] = [(0, None)] * settings.DATAGRAM_BATCH_SIZE
+
+    def run(self):
+        logger.debug('Datagram server is listening on %s', self.settings.SERVER_ADDRESS)
+        try:
+            while True:
+                readable_socket_list, _, _ = select.select([self.server], [], [], self.settings.SOCKET_TIMEOUT)
+                if not readable_socket_list:
+                    continue
+                received_count = self._receive_batch()
+                for buffer, (length, peer) in zip(self._buffers, self._batch[:received_count]):
+                    self._handle_datagram(buffer, length, peer)
+        finally:
+            self.server.close()
+
+    def _receive_batch(self) -> int:
+        received_count = 0
+        while received_count < len(self._buffers):
+            try:
+                self._batch[received_count] = self.server.recvfrom_into(self._buffers[received_count])
+            except BlockingIOError:
+                break
+            received_count += 1
+        return received_count
+
+    def _handle_datagram(self, buffer: bytearray, length: int, peer: Address) -> None:
+        try:
+            msg = _parse_datagram(buffer, length, self.settings)
+        except MalformedDatagram as e:
+            logger.warning('dropping malformed datagram from %s: %s', peer, e)
+            return
+        try:
+            self.worker.on_message(msg, peer)
+        except Exception as e:
+            # fire-and-forget traffic: one failing message must not stop the server
+            logger.exception('handler failed on datagram from %s: %s', peer, e)
+
+
+class DatagramClient():
+    '''
+    sends one message per datagram to settings server address, no connection is established
+    receive_one_msg is only useful with servers which reply (e.g. echo)
+    '''
+    def __init__(self, *, settings: TcpSettings):
+        self.settings = settings
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client.settimeout(self.settings.SOCKET_TIMEOUT)
+        self.target = (settings.SERVER_ADDRESS, settings.PORT)
+        self._receive_buffer = bytearray(settings.MAX_DATAGRAM_SIZE)
+
+    def send(self, msg: Any) -> None:
+        _send_datagram(self.client, msg, self.target, self.settings)
+
+    def receive_one_msg(self) -> Any:
+        length, _ = self.client.recvfrom_into(self._receive_buffer)
+        return _parse_datagram(self._receive_buffer, length, self.settings)
+
+    def close(self) -> None:
+        self.client.close()
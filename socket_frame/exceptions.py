@@ -25,4 +25,23 @@ class SocketNotReadyYetTryAgainException(socket.error):
 
 
 class SocketIsClosed(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class NumpyIsNotInstalled(Exception):
+    pass
+
+
+class NdarrayPayloadNotSupported(Exception):
+    pass
+
+
+class MessageExceedsDatagramCapacity(Exception):
+    pass
+
+
+class MalformedDatagram(Exception):
+    pass
+
+
+class MessageExceedsMaxSize(Exception):
+    pass
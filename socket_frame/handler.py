@@ -13,9 +13,11 @@ class BaseHandler():
     '''
     Class to handle message, instance interacts only with related worker by using its' send/receive methods
     '''
+    __slots__ = ('worker', 'settings')
+
     def __init__(self, worker: Worker, settings: TcpSettings):
         self.worker = worker
-        self.worker.set_on_message(lambda msg: self.handle_message(msg))
+        self.worker.set_on_message(self.handle_message)
         self.settings = settings  # currently not used
 
     def handle_message(self, msg: Any):
@@ -26,6 +28,8 @@ class EchoHandler(BaseHandler):
     '''
     Class which just returns message back to sender
     '''
+    __slots__ = ()
+
     def handle_message(self, msg: Any):
         logger.info('got message %s in handler', msg)
         self.worker.send_message(msg)
@@ -35,6 +39,8 @@ class EchoAsyncHandler(BaseHandler):
     '''
     Class which just returns message back to sender
     '''
+    __slots__ = ()
+
     def handle_message(self, msg: Any):
         logger.info('got message %s in handler', msg)
         yield from self.worker.send_message(msg)
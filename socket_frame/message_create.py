@@ -1,12 +1,25 @@
 import json
-from typing import Any
+from typing import Any, List, Union
 
 from .header import make_header_bytestr
+from .ndarray_payload import is_ndarray, make_ndarray_payload_parts
 from .settings import TcpSettings
 
 
-def make_message(payload: Any, settings: TcpSettings) -> bytes:
+def make_message_parts(payload: Any, settings: TcpSettings) -> List[Union[bytes, memoryview]]:
+    '''
+    message as a list of buffers to be sent one after another
+    json message is a single part, ndarray message keeps array data as a separate part to avoid copying it
+    '''
+    if is_ndarray(payload):
+        payload_parts = make_ndarray_payload_parts(payload, settings)
+        header = make_header_bytestr(sum(len(part) for part in payload_parts), settings)
+        return [header + payload_parts[0]] + payload_parts[1:]
     payload_str = json.dumps(payload)
     payload_bytes = payload_str.encode(settings.MSG_FORMAT)
     header = make_header_bytestr(len(payload_bytes), settings)
-    return header + payload_bytes
+    return [header + payload_bytes]
+
+
+def make_message(payload: Any, settings: TcpSettings) -> bytes:
+    return b''.join(make_message_parts(payload, settings))
@@ -1,9 +1,12 @@
 import json
-from typing import Any
+from typing import Any, Union
 
+from .ndarray_payload import is_ndarray_payload, parse_ndarray_payload
 from .settings import TcpSettings
 
-def parse_message(payload_bytes: bytes, settings: TcpSettings) -> Any:
+def parse_message(payload_bytes: Union[bytes, bytearray], settings: TcpSettings) -> Any:
+    if is_ndarray_payload(payload_bytes):
+        return parse_ndarray_payload(payload_bytes, settings)
     payload_str = payload_bytes.decode(settings.MSG_FORMAT)
     payload = json.loads(payload_str)
     return payload
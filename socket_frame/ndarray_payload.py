@@ -0,0 +1,61 @@
+from typing import Any, List, Union
+import json
+import struct
+
+from .constants import NDARRAY_PAYLOAD_MARKER
+from .exceptions import NdarrayPayloadNotSupported, NumpyIsNotInstalled
+from .settings import TcpSettings
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only ndarray frames need it
+    np = None
+
+
+# ndarray payload: marker byte, descriptor length, json descriptor (dtype/shape/order), raw array buffer
+DESCRIPTOR_LENGTH = struct.Struct('!I')
+
+
+def is_ndarray(payload: Any) -> bool:
+    return np is not None and isinstance(payload, np.ndarray)
+
+
+def make_ndarray_payload_parts(array: 'np.ndarray', settings: TcpSettings) -> List[Union[bytes, memoryview]]:
+    '''
+    returns descriptor prefix and a view of array memory, so array data is sent without copying
+    (only non-contiguous arrays are copied once to become contiguous)
+    '''
+    if array.dtype.hasobject:
+        raise NdarrayPayloadNotSupported('arrays of python objects have no raw buffer to send')
+    if array.flags.c_contiguous:
+        order = 'C'
+    elif array.flags.f_contiguous:
+        order = 'F'
+    else:
+        array = np.ascontiguousarray(array)
+        order = 'C'
+    # descr keeps field names, offsets and nesting of structured dtypes, dtype.str would turn them into opaque void
+    descriptor = {'dtype': np.lib.format.dtype_to_descr(array.dtype), 'shape': array.shape, 'order': order}
+    descriptor = json.dumps(descriptor).encode(settings.MSG_FORMAT)
+    prefix = NDARRAY_PAYLOAD_MARKER + DESCRIPTOR_LENGTH.pack(len(descriptor)) + descriptor
+    # ravel(order='K') of a contiguous array is a view, uint8 view makes buffer exportable for any dtype
+    return [prefix, memoryview(array.ravel(order='K').view(np.uint8))]
+
+
+def is_ndarray_payload(payload_bytes: Union[bytes, bytearray]) -> bool:
+    return payload_bytes[:1] == NDARRAY_PAYLOAD_MARKER
+
+
+def parse_ndarray_payload(payload_bytes: Union[bytes, bytearray], settings: TcpSettings) -> 'np.ndarray':
+    '''array shares memory with payload_bytes (it is writable if payload_bytes is a bytearray)'''
+    if np is None:
+        raise NumpyIsNotInstalled('received ndarray payload, numpy is required to parse it')
+    payload_view = memoryview(payload_bytes)
+    descriptor_start = len(NDARRAY_PAYLOAD_MARKER) + DESCRIPTOR_LENGTH.size
+    descriptor_length, = DESCRIPTOR_LENGTH.unpack_from(payload_view, len(NDARRAY_PAYLOAD_MARKER))
+    data_start = descriptor_start + descriptor_length
+    descriptor = json.loads(payload_view[descriptor_start:data_start].tobytes().decode(settings.MSG_FORMAT))
+    # json turned descr tuples into lists, descr_to_dtype accepts both
+    dtype = np.lib.format.descr_to_dtype(descriptor['dtype'])
+    array = np.frombuffer(payload_view[data_start:], dtype=dtype)
+    return array.reshape(descriptor['shape'], order=descriptor['order'])
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from itertools import count
+from threading import Lock
+from time import monotonic
+from typing import Dict
+
+
+class QueueStats():
+    '''
+    depth of a work queue, how long its oldest not yet started item has been waiting,
+    and smoothed time items waited before they were started
+    enqueued() returns a token which has to be passed back to started(), items may start in any order
+    '''
+    def __init__(self, smoothing: float = 0.2):
+        self.latency = 0.0
+        self._smoothing = smoothing
+        # insertion ordered, so the first one is the oldest waiting item
+        self._waiting: Dict[int, float] = OrderedDict()
+        self._tokens = count()
+        self._lock = Lock()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiting)
+
+    def enqueued(self) -> int:
+        with self._lock:
+            token = next(self._tokens)
+            self._waiting[token] = monotonic()
+        return token
+
+    def started(self, token: int) -> None:
+        with self._lock:
+            waited = monotonic() - self._waiting.pop(token)
+            self.latency += self._smoothing * (waited - self.latency)
+
+    def oldest_wait(self) -> float:
+        '''unlike latency it keeps growing while nothing starts, so a saturated queue shows up at once'''
+        with self._lock:
+            if not self._waiting:
+                return 0.0
+            return monotonic() - next(iter(self._waiting.values()))
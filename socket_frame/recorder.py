@@ -0,0 +1,65 @@
+from base64 import b64decode, b64encode
+from itertools import count
+from logging import getLogger
+from threading import Lock
+from typing import Iterator, NamedTuple
+import json
+import time
+
+
+logger = getLogger(__name__)
+
+
+class RecordedFrame(NamedTuple):
+    timestamp: float
+    connection_id: int
+    payload: bytes
+
+
+class TrafficRecorder():
+    '''
+    append-only capture of inbound frames, one jsonl line per frame: timestamp, connection id and raw payload
+    payload is stored as is (base64) so replay sends exactly the same bytes, whatever codec produced them
+    one instance can be shared by all workers of a server (writes are guarded by a lock)
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='ascii')
+        self._lock = Lock()
+        self._connection_ids = count()
+
+    def register_connection(self) -> int:
+        with self._lock:
+            return next(self._connection_ids)
+
+    def record(self, connection_id: int, payload: bytes) -> None:
+        line = json.dumps({
+            'ts': time.time(),
+            'conn': connection_id,
+            'payload': b64encode(payload).decode('ascii'),
+        })
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_recording(path: str) -> Iterator[RecordedFrame]:
+    with open(path, 'r', encoding='ascii') as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            yield RecordedFrame(entry['ts'], entry['conn'], b64decode(entry['payload']))
@@ -0,0 +1,149 @@
+from logging import getLogger
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from time import perf_counter
+from typing import Dict, NamedTuple, Optional, Set
+import socket
+
+from .header import make_header_bytestr
+from .recorder import read_recording
+from .settings import TcpSettings
+
+
+logger = getLogger(__name__)
+
+
+class ReplayStats(NamedTuple):
+    frames_sent: int
+    # frames of connections the server had hung up on or refused, they are not sent
+    frames_dropped: int
+    bytes_sent: int
+    bytes_received: int
+    elapsed: float
+
+
+class TrafficReplayer():
+    '''
+    drives frames captured by TrafficRecorder against a running server (any server class, it only talks the wire protocol)
+    every recorded connection id gets its own connection, responses are drained and counted, not parsed
+    speed=1.0 keeps original timing, speed=k plays k times faster, speed=None sends as fast as possible
+    once the server hangs up on a connection (or refuses to open it), the rest of its frames is dropped and counted,
+    other connections go on
+    '''
+    def __init__(self, settings: TcpSettings, *, speed: Optional[float] = 1.0, drain_timeout: float = 0.5):
+        if speed is not None and speed <= 0:
+            raise ValueError(f'speed has to be positive (None sends as fast as possible), got {speed}')
+        self.settings = settings
+        self.speed = speed
+        self.drain_timeout = drain_timeout
+        self._selector = DefaultSelector()
+        self._connections: Dict[int, socket.socket] = {}
+        self._hung_up: Set[int] = set()
+        self._bytes_received = 0
+
+    def replay(self, path: str) -> ReplayStats:
+        frames_sent = 0
+        frames_dropped = 0
+        bytes_sent = 0
+        first_timestamp = None
+        started = perf_counter()
+        try:
+            for frame in read_recording(path):
+                if first_timestamp is None:
+                    first_timestamp = frame.timestamp
+                if self.speed is not None:
+                    due = started + (frame.timestamp - first_timestamp) / self.speed
+                    self._wait_until(due)
+                if frame.connection_id in self._hung_up:
+                    frames_dropped += 1
+                    continue
+                conn = self._get_connection(frame.connection_id)
+                if conn is None:
+                    frames_dropped += 1
+                    continue
+                data = make_header_bytestr(len(frame.payload), self.settings) + frame.payload
+                if not self._send_all(conn, data):
+                    frames_dropped += 1
+                    continue
+                frames_sent += 1
+                bytes_sent += len(data)
+            # let the server answer the tail of the recording
+            while self._connections and self._poll(self.drain_timeout):
+                pass
+        finally:
+            for conn in list(self._connections.values()):
+                self._close(conn)
+        return ReplayStats(frames_sent, frames_dropped, bytes_sent, self._bytes_received, perf_counter() - started)
+
+    def _get_connection(self, connection_id: int) -> Optional[socket.socket]:
+        conn = self._connections.get(connection_id)
+        if conn is None:
+            try:
+                conn = socket.create_connection(
+                    (self.settings.SERVER_ADDRESS, self.settings.PORT), timeout=self.settings.SOCKET_TIMEOUT)
+            except OSError as e:
+                # e.g. server is restarting or its accept backlog is full
+                logger.warning('could not open replayed connection %s: %s, its frames are dropped', connection_id, e)
+                self._hung_up.add(connection_id)
+                return None
+            conn.setblocking(False)
+            self._selector.register(conn, EVENT_READ, connection_id)
+            self._connections[connection_id] = conn
+        return conn
+
+    def _wait_until(self, due: float) -> None:
+        remaining = due - perf_counter()
+        while remaining > 0:
+            self._poll(remaining)
+            remaining = due - perf_counter()
+
+    def _send_all(self, conn: socket.socket, data: bytes) -> bool:
+        '''False if server hung up before data was sent'''
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[conn.send(view):]
+            except BlockingIOError:
+                # keep reading responses while waiting, otherwise server and replayer can block on each other
+                connection_id = self._selector.get_key(conn).data
+                self._selector.modify(conn, EVENT_READ | EVENT_WRITE, connection_id)
+                self._poll(self.settings.SOCKET_TIMEOUT)
+                if connection_id in self._hung_up:
+                    return False
+                self._selector.modify(conn, EVENT_READ, connection_id)
+            except (BrokenPipeError, ConnectionResetError):
+                self._hang_up(conn)
+                return False
+        return True
+
+    def _poll(self, timeout: float) -> bool:
+        events = self._selector.select(timeout)
+        for key, mask in events:
+            if not mask & EVENT_READ:
+                continue
+            try:
+                chunk = key.fileobj.recv(self.settings.BYTES_CHUNK_SIZE)
+            except BlockingIOError:
+                continue
+            except ConnectionResetError:
+                chunk = b''
+            if chunk:
+                self._bytes_received += len(chunk)
+            else:
+                self._hang_up(key.fileobj)
+        return bool(events)
+
+    def _hang_up(self, conn: socket.socket) -> None:
+        connection_id = self._selector.get_key(conn).data
+        logger.info('server closed replayed connection %s, its remaining frames are dropped', connection_id)
+        self._hung_up.add(connection_id)
+        self._close(conn)
+
+    def _close(self, conn: socket.socket) -> None:
+        connection_id = self._selector.get_key(conn).data
+        self._selector.unregister(conn)
+        self._connections.pop(connection_id, None)
+        conn.close()
+
+
+def replay(path: str, settings: TcpSettings, *, speed: Optional[float] = 1.0) -> ReplayStats:
+    return TrafficReplayer(settings, speed=speed).replay(path)
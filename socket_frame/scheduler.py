@@ -0,0 +1,164 @@
+from collections import deque
+from logging import getLogger
+from threading import Condition
+from typing import Callable, Deque, Dict, Generator, Optional, Set, Tuple
+
+from .constants import CurrentOperationEnum
+from .exceptions import SocketIsClosed
+from .queue_stats import QueueStats
+from .settings import TcpSettings
+from .worker import GeneratorWorker
+
+
+logger = getLogger(__name__)
+
+
+class FairScheduler():
+    '''
+    runs generator tasks of nonblocking servers in turns
+    one turn: task is stepped until it stops moving bytes (socket would block) or spends its per-turn read/write budget,
+    so a flooding connection cannot hold the event loop longer than its budget
+    (GeneratorWorker moves at most BYTES_CHUNK_SIZE per recv/send, so a turn overshoots its budget by less than a chunk)
+    ready set is deduplicated: marking a queued task ready again is a no-op, marking a running task requeues it once
+    ready tasks are kept per priority class, every pass gives one turn to each ready task, higher priorities first,
+    and a task of priority p > 0 gets (1 + p) times the per-turn budget, so higher classes also get a bigger share of bytes
+    requeue_after_turn=True keeps polling tasks (NonBlockingSocketServer), False waits for mark_ready (select based)
+    a task blocked on send is requeued every pass unless on_blocked_on_send is given: then the caller is expected
+    to watch the socket for writability and mark the task ready, so a slow reader does not make the loop spin
+    an exception of one task finishes that task only, other tasks keep running
+    queue_stats count runnable tasks only: a polled task requeued after a turn without progress is not counted
+    '''
+    def __init__(
+        self,
+        settings: TcpSettings,
+        *,
+        requeue_after_turn: bool = True,
+        on_finished: Optional[Callable[[Generator, GeneratorWorker], None]] = None,
+        on_blocked_on_send: Optional[Callable[[Generator, GeneratorWorker], None]] = None,
+    ):
+        self.settings = settings
+        self.requeue_after_turn = requeue_after_turn
+        self._on_finished = on_finished
+        self._on_blocked_on_send = on_blocked_on_send
+        self._tasks: Dict[Generator, Tuple[GeneratorWorker, int]] = {}
+        self._ready: Dict[int, Deque[Generator]] = {}
+        self._queued: Set[Generator] = set()
+        self._enqueue_tokens: Dict[Generator, Optional[int]] = {}
+        # how long ready tasks wait for their turn, used by admission control
+        self.queue_stats = QueueStats()
+        self._running: Optional[Generator] = None
+        self._marked_while_running = False
+        self._condition = Condition()
+        self._stopped = False
+
+    def add(self, task: Generator, worker: GeneratorWorker, priority: int = 0) -> None:
+        with self._condition:
+            self._tasks[task] = (worker, priority)
+        self.mark_ready(task)
+
+    def mark_ready(self, task: Generator) -> None:
+        with self._condition:
+            if task not in self._tasks or task in self._queued:
+                return
+            if task is self._running:
+                self._marked_while_running = True
+                return
+            self._enqueue(task)
+            self._condition.notify()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._queued)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queued and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    break
+                current_pass = self._take_pass()
+            for task, enqueue_token in current_pass:
+                self._run_turn(task, enqueue_token)
+
+    def _enqueue(self, task: Generator, runnable: bool = True) -> None:
+        _, priority = self._tasks[task]
+        self._ready.setdefault(priority, deque()).append(task)
+        self._queued.add(task)
+        # a polled task which did nothing in its last turn is likely idle, queue stats would count every connection
+        self._enqueue_tokens[task] = self.queue_stats.enqueued() if runnable else None
+
+    def _take_pass(self) -> list:
+        # enqueue token is taken with the task: it can be queued again for the next pass before its turn in this one
+        current_pass = []
+        for priority in sorted(self._ready, reverse=True):
+            current_pass.extend((task, self._enqueue_tokens.pop(task)) for task in self._ready[priority])
+            self._ready[priority].clear()
+        self._queued.clear()
+        return current_pass
+
+    def _run_turn(self, task: Generator, enqueue_token: Optional[int]) -> None:
+        with self._condition:
+            if enqueue_token is not None:
+                self.queue_stats.started(enqueue_token)
+            if task not in self._tasks:
+                # marked ready again after the pass was taken, but finished during that pass
+                return
+            worker, priority = self._tasks[task]
+            self._running = task
+            self._marked_while_running = False
+        share = 1 + max(priority, 0)
+        read_limit = worker.bytes_received + self.settings.READ_BUDGET_BYTES * share
+        write_limit = worker.bytes_sent + self.settings.WRITE_BUDGET_BYTES * share
+        moved_at_start = worker.bytes_received + worker.bytes_sent
+        budget_spent = False
+        try:
+            while True:
+                moved_before = worker.bytes_received + worker.bytes_sent
+                next(task)
+                if worker.bytes_received >= read_limit or worker.bytes_sent >= write_limit:
+                    budget_spent = True
+                    break
+                if worker.bytes_received + worker.bytes_sent == moved_before:
+                    # socket would block, nothing to gain from stepping further in this pass
+                    break
+        except (StopIteration, SocketIsClosed):
+            # task is finished/dead - no need to keep it in event loop
+            logger.info('task finished, socket is closed now')
+            self._finish(task)
+            return
+        except Exception as e:
+            # malformed frame, handler bug or unexpected socket error - only this connection is dropped
+            logger.exception('task failed with unexpected error %s', e)
+            self._finish(task)
+            return
+        with self._condition:
+            self._running = None
+            blocked_on_send = worker.current_operation is CurrentOperationEnum.WRITING
+            # without on_blocked_on_send a task blocked on send is not watched by anyone but the scheduler itself
+            wait_for_writability = (
+                blocked_on_send and self._on_blocked_on_send is not None
+                and not budget_spent and not self._marked_while_running
+            )
+            requeue = (
+                budget_spent or (blocked_on_send and not wait_for_writability)
+                or self.requeue_after_turn or self._marked_while_running
+            )
+            # it could have been marked ready after the pass was taken, before its turn - keep ready set deduplicated
+            if requeue and task not in self._queued:
+                made_progress = worker.bytes_received + worker.bytes_sent != moved_at_start
+                self._enqueue(task, runnable=budget_spent or made_progress or self._marked_while_running)
+        if wait_for_writability and not requeue:
+            self._on_blocked_on_send(task, worker)
+
+    def _finish(self, task: Generator) -> None:
+        with self._condition:
+            self._running = None
+            worker, _ = self._tasks.pop(task)
+        if self._on_finished is not None:
+            self._on_finished(task, worker)
@@ -1,15 +1,18 @@
+from collections import deque
 from logging import getLogger
 from multiprocessing.pool import ThreadPool
-from queue import Queue
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE, SelectorKey
 from threading import Thread
-from time import sleep
+from typing import Callable, Deque, Dict, Generator, Optional
 import errno
-import queue
-import select
 import socket
 
-from .constants import STOP_DAEMON_THREAD_EVENT_LOOP_TASK_STR
-from .exceptions import CoreHandlerNotSpecified, SocketIsClosed, UnexpectedSocketError
+from .admission import AdmissionController
+from .buffer_pool import BufferPool
+from .exceptions import CoreHandlerNotSpecified
+from .recorder import TrafficRecorder
+from .queue_stats import QueueStats
+from .scheduler import FairScheduler
 from .settings import TcpSettings
 from .worker import Worker, GeneratorWorker
 
@@ -18,9 +21,10 @@ logger = getLogger(__name__)
 
 
 class Server():
-    def __init__(self, settings: TcpSettings, core_handler=None):
+    def __init__(self, settings: TcpSettings, core_handler=None, recorder: Optional[TrafficRecorder] = None):
         self.workers_pool = ThreadPool(settings.THREADPOOL_SIZE)
         self.settings = settings
+        self.recorder = recorder
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server.settimeout(self.settings.SOCKET_TIMEOUT)
         self.server.bind((settings.SERVER_ADDRESS, settings.PORT))
@@ -28,6 +32,9 @@ class Server():
             self.default_handler = core_handler
         else:
             raise CoreHandlerNotSpecified
+        self.queue_stats = QueueStats()
+        self.admission = AdmissionController(settings, queue_stats=self.queue_stats)
+        self.buffer_pool = BufferPool(settings.BYTES_CHUNK_SIZE)
     
     def run(self):
         try:
@@ -35,19 +42,41 @@ class Server():
             logger.debug("Server is listening on %s", self.settings.SERVER_ADDRESS)
             while True:
                 conn, addr = self.server.accept()
+                if not self.admission.admit(addr):
+                    self.admission.reject(conn)
+                    continue
                 logger.debug('Listening to a new client')
-                worker = Worker(conn, settings=self.settings)
-                self.workers_pool.apply_async(func=self.default_handler, args=(worker,), kwds={'settings': self.settings})
+                worker = Worker(conn, settings=self.settings, recorder=self.recorder, buffer_pool=self.buffer_pool)
+                enqueue_token = self.queue_stats.enqueued()
+                self.workers_pool.apply_async(func=self._handle_connection, args=(worker, enqueue_token))
         except Exception as e:
             logger.exception('an unexpected ServerError has occured %s', e)
         finally:
             self.server.shutdown(socket.SHUT_RDWR)
             self.server.close()
+            if self.recorder is not None:
+                self.recorder.flush()
+
+    def _handle_connection(self, worker: Worker, enqueue_token: int):
+        self.queue_stats.started(enqueue_token)
+        try:
+            self.default_handler(worker, settings=self.settings)
+        finally:
+            if worker.conn.fileno() != -1:
+                worker.conn.close()
+            self.admission.release()
 
 
 class NonBlockingSocketServer():
-    def __init__(self, settings: TcpSettings, core_handler=None):
+    def __init__(
+        self,
+        settings: TcpSettings,
+        core_handler=None,
+        recorder: Optional[TrafficRecorder] = None,
+        priority_of: Optional[Callable[[GeneratorWorker], int]] = None,
+    ):
         self.settings = settings
+        self.recorder = recorder
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server.setblocking(0)
         self.server.settimeout(self.settings.SOCKET_TIMEOUT)
@@ -56,7 +85,11 @@ class NonBlockingSocketServer():
             self.default_handler = core_handler
         else:
             raise CoreHandlerNotSpecified
-        self.active_tasks_queue = Queue()
+        # priority_of lets caller put some connections (e.g. by peer address) into a higher priority class
+        self.priority_of = priority_of
+        self.scheduler = self._make_scheduler()
+        self.admission = AdmissionController(settings, queue_stats=self.scheduler.queue_stats)
+        self.buffer_pool = BufferPool(settings.BYTES_CHUNK_SIZE)
         self.daemon_thread = Thread(target = self._execute_event_loop_for_all_connections, daemon=True)
     
     def run(self):
@@ -66,18 +99,44 @@ class NonBlockingSocketServer():
         finally:
             self.server.shutdown(socket.SHUT_RDWR)
             self.server.close()
-            self.active_tasks_queue.put(STOP_DAEMON_THREAD_EVENT_LOOP_TASK_STR)
+            self.scheduler.stop()
             self.daemon_thread.join()
+            if self.recorder is not None:
+                self.recorder.flush()
     
+    def _make_scheduler(self) -> FairScheduler:
+        return FairScheduler(self.settings, requeue_after_turn=True, on_finished=self._on_task_finished)
+
+    def _add_task_for_connection(self, conn: socket.socket) -> Generator:
+        # accepted socket does not inherit nonblocking mode, a blocking recv would stall every other task
+        conn.setblocking(0)
+        worker = GeneratorWorker(conn, settings = self.settings, recorder = self.recorder, buffer_pool = self.buffer_pool)
+        task = self.default_handler(worker, settings = self.settings)
+        # before the task is scheduled, so it cannot finish before its connection is watched
+        self._watch(conn, task)
+        priority = self.priority_of(worker) if self.priority_of is not None else 0
+        self.scheduler.add(task, worker, priority)
+        return task
+
+    def _watch(self, conn: socket.socket, task: Generator) -> None:
+        # every task is polled, nothing to watch
+        pass
+
+    def _on_task_finished(self, task: Generator, worker: GeneratorWorker) -> None:
+        if worker.conn.fileno() != -1:
+            worker.conn.close()
+        self.admission.release()
+
     def _run(self):
         self.server.listen()
         while True:
             conn = None
             try:
                 conn, addr = self.server.accept()
-                worker = GeneratorWorker(conn, settings = self.settings)
-                task = self.default_handler(worker, settings = self.settings) 
-                self.active_tasks_queue.put(task)
+                if not self.admission.admit(addr):
+                    self.admission.reject(conn)
+                    continue
+                self._add_task_for_connection(conn)
             except socket.timeout:
                 if conn:
                     conn.shutdown(socket.SHUT_RDWR)
@@ -94,85 +153,114 @@ class NonBlockingSocketServer():
         self.daemon_thread.start()
     
     def _execute_event_loop_for_all_connections(self):
-
-        while True:
-            try:
-                alive_task = self.active_tasks_queue.get(block=False)
-                if alive_task == STOP_DAEMON_THREAD_EVENT_LOOP_TASK_STR:
-                    break
-            except queue.Empty:
-                # FIXME: not sure what would be appropriate as a sleep value
-                sleep(0)
-                continue
-            try:
-                next(alive_task)
-                self.active_tasks_queue.put(alive_task)
-            except SocketIsClosed:
-                # task is finished/dead - no need to keep it in event loop
-                logger.info('task finished, socket is closed now')
-
-            # FIXME: not sure that it is correct to put zero sleep here need to ask is it set as env var or zero?
-            sleep(0)
+        self.scheduler.run()
 
 
 class SelectBasedServer(NonBlockingSocketServer):
+    '''
+    event loop thread only gets a task when selector reports its socket readable, scheduler deduplicates repeated reports
+    a task blocked on sending gets its socket watched for writability instead, until selector reports it writable
+    selector is touched by accepting thread only: event loop thread queues registration changes
+    and wakes selector up through a socketpair
+    '''
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._conn_fileno_mapped_to_tasks = {}
+        self._selector = DefaultSelector()
+        self._pending_changes: Deque[Callable[[], None]] = deque()
+        # only accepting thread reads and writes it, like the selector itself
+        self._fds_of_tasks: Dict[Generator, int] = {}
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(0)
+        self._wakeup_writer.setblocking(0)
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            self._selector.close()
+            self._wakeup_reader.close()
+            self._wakeup_writer.close()
+
+    def _make_scheduler(self) -> FairScheduler:
+        return FairScheduler(
+            self.settings,
+            requeue_after_turn=False,
+            on_finished=self._on_task_finished,
+            on_blocked_on_send=self._on_task_blocked_on_send,
+        )
+
+    def _on_task_finished(self, task: Generator, worker: GeneratorWorker) -> None:
+        self._request_change(lambda: self._unregister(task))
+        super()._on_task_finished(task, worker)
+
+    def _on_task_blocked_on_send(self, task: Generator, worker: GeneratorWorker) -> None:
+        # writability only: with unread requests queued the socket stays readable, level triggered selector
+        # would report it on every select and the task would be run over and over without progress
+        self._request_change(lambda: self._set_events(self._key_of(task), EVENT_WRITE))
+
+    def _request_change(self, change: Callable[[], None]) -> None:
+        self._pending_changes.append(change)
+        try:
+            self._wakeup_writer.send(b'\0')
+        except BlockingIOError:
+            # wakeup socket is full, selector is going to wake up anyway
+            pass
+
+    def _apply_pending_changes(self) -> None:
+        try:
+            while self._wakeup_reader.recv(self.settings.BYTES_CHUNK_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        while self._pending_changes:
+            self._pending_changes.popleft()()
+
+    def _key_of(self, task: Generator) -> Optional[SelectorKey]:
+        # fd is looked up by task: socket could be closed already, and its fd number reused by a newer connection
+        fileno = self._fds_of_tasks.get(task)
+        key = self._selector.get_map().get(fileno) if fileno is not None else None
+        return key if key is not None and key.data is task else None
+
+    def _set_events(self, key: Optional[SelectorKey], events: int) -> None:
+        if key is None or key.events == events:
+            return
+        try:
+            self._selector.modify(key.fileobj, events, key.data)
+        except OSError:
+            if key.fileobj.fileno() != -1:
+                raise
+            # closed by event loop thread meanwhile, its unregistration is already queued
+
+    def _unregister(self, task: Generator) -> None:
+        key = self._key_of(task)
+        self._fds_of_tasks.pop(task)
+        if key is not None:
+            self._selector.unregister(key.fileobj)
+
+    def _watch(self, conn: socket.socket, task: Generator) -> None:
+        stale_key = self._selector.get_map().get(conn.fileno())
+        if stale_key is not None:
+            # finished connection whose unregister is still pending had the same fd number
+            self._selector.unregister(stale_key.fileobj)
+        self._selector.register(conn, EVENT_READ, task)
+        self._fds_of_tasks[task] = conn.fileno()
 
     def _run(self):
         self.server.listen()
+        self._selector.register(self.server, EVENT_READ)
+        self._selector.register(self._wakeup_reader, EVENT_READ)
 
-        conn = None
-        readable_socket_list = [self.server]
-        writable_socket_list = []
         while True:
-            # Get the list sockets which are readable
-            if not readable_socket_list:
-                readable_socket_list.append(self.server)
-            readable_socket_list, writeable_socket_list, error_sockets = select.select(
-                readable_socket_list, writable_socket_list, [])
-
-            new_writable_socket_list = []
-            # FIXME: separate as generator?
-            for socket in readable_socket_list + writeable_socket_list:
-                if socket is self.server:
-                    conn, addr = socket.accept()
-                    new_writable_socket_list.append(conn)
-                else:
-                    conn = socket
-                
-                # FIXME: need to make separate method
-                if conn.fileno() not in self._conn_fileno_mapped_to_tasks:
-                    worker = GeneratorWorker(conn, settings = self.settings)
-                    task = self.default_handler(worker, settings = self.settings)
-                    self._conn_fileno_mapped_to_tasks[conn.fileno()] = task
+            for key, events in self._selector.select(self.settings.SOCKET_TIMEOUT):
+                if key.fileobj is self._wakeup_reader:
+                    self._apply_pending_changes()
+                elif key.fileobj is self.server:
+                    conn, addr = self.server.accept()
+                    if not self.admission.admit(addr):
+                        self.admission.reject(conn)
+                        continue
+                    self._add_task_for_connection(conn)
                 else:
-                    task = self._conn_fileno_mapped_to_tasks[conn.fileno()]
-                # FIXME: here we have a problem need to check that active task and socket state coincide
-                self.active_tasks_queue.put(task)
-            writable_socket_list = new_writable_socket_list
-            for conn in error_sockets:
-                try:
-                    self._conn_fileno_mapped_to_tasks.pop(conn.fileno())
-                except KeyError:
-                    pass
-
-    def _execute_event_loop_for_all_connections(self):
-        while True:
-            try:
-                alive_task = self.active_tasks_queue.get(block=False)
-                if alive_task == STOP_DAEMON_THREAD_EVENT_LOOP_TASK_STR:
-                    break
-            except queue.Empty:
-                # FIXME: not sure what would be appropriate as a sleep value
-                sleep(0)
-                continue
-            try:
-                next(alive_task)
-            except SocketIsClosed:
-                # task is finished/dead - no need to keep it in event loop
-                logger.info('task finished, socket is closed now')
-
-            # FIXME: not sure that it is correct to put zero sleep here need to ask is it set as env var or zero?
-            sleep(0)
\ No newline at end of file
+                    if events & EVENT_WRITE:
+                        self._set_events(key, EVENT_READ)
+                    self.scheduler.mark_ready(key.data)
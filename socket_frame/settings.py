@@ -19,6 +19,19 @@ class TcpSettings():
     BLOCKING_MODE: bool
     HEADER_TYPE: HeaderTypeEnum
     HEADER_TERMINATION_SEQUENCE: str
+    READ_BUDGET_BYTES: int
+    WRITE_BUDGET_BYTES: int
+    MAX_CONNECTIONS: Optional[int]
+    ACCEPT_RATE_LIMIT: Optional[float]
+    ACCEPT_BURST: int
+    PER_CLIENT_RATE_LIMIT: Optional[float]
+    PER_CLIENT_BURST: int
+    MAX_QUEUE_DEPTH: Optional[int]
+    MAX_QUEUE_LATENCY: Optional[float]
+    BUSY_MESSAGE: str
+    MAX_DATAGRAM_SIZE: int
+    DATAGRAM_BATCH_SIZE: int
+    MAX_MESSAGE_SIZE: int
 
     def __init__(
         self,
@@ -35,7 +48,20 @@ class TcpSettings():
         socket_timeout: float = 5,
         blocking_mode: bool = True,
         header_type: HeaderTypeEnum = HeaderTypeEnum.DELIMITER_TERMINATED,
-        header_termination_sequence: str = '\r\n\r\n'
+        header_termination_sequence: str = '\r\n\r\n',
+        read_budget_bytes: int = 65536,
+        write_budget_bytes: int = 65536,
+        max_connections: Optional[int] = None,
+        accept_rate_limit: Optional[float] = None,
+        accept_burst: int = 100,
+        per_client_rate_limit: Optional[float] = None,
+        per_client_burst: int = 10,
+        max_queue_depth: Optional[int] = None,
+        max_queue_latency: Optional[float] = None,
+        busy_message: str = '!BUSY',
+        max_datagram_size: int = 65507,
+        datagram_batch_size: int = 32,
+        max_message_size: int = 128 * 1024 * 1024,
     ):
         self.HEADER_LENGTH = header_length
         self.PORT = port
@@ -56,6 +82,22 @@ class TcpSettings():
         self.BLOCKING_MODE_BOOL = blocking_mode
         self.HEADER_TYPE = header_type
         self.HEADER_TERMINATION_SEQUENCE = header_termination_sequence
+        self.READ_BUDGET_BYTES = read_budget_bytes
+        self.WRITE_BUDGET_BYTES = write_budget_bytes
+        # admission control, None disables a limit; rates are connections per second
+        self.MAX_CONNECTIONS = max_connections
+        self.ACCEPT_RATE_LIMIT = accept_rate_limit
+        self.ACCEPT_BURST = accept_burst
+        self.PER_CLIENT_RATE_LIMIT = per_client_rate_limit
+        self.PER_CLIENT_BURST = per_client_burst
+        self.MAX_QUEUE_DEPTH = max_queue_depth
+        self.MAX_QUEUE_LATENCY = max_queue_latency
+        self.BUSY_MESSAGE = busy_message
+        # udp mode: whole message (header included) has to fit into one datagram
+        self.MAX_DATAGRAM_SIZE = max_datagram_size
+        self.DATAGRAM_BATCH_SIZE = datagram_batch_size
+        # payload buffer is allocated as soon as header is read, so length announced by a peer has to be bounded
+        self.MAX_MESSAGE_SIZE = max_message_size
     
     @classmethod
     def initialize_from_env_vars(cls):
@@ -75,6 +117,19 @@ class TcpSettings():
         blocking_mode = os.environ.get('BLOCKING_MODE_BOOL') == 'True'
         header_type = os.environ.get('HEADER_TYPE', HeaderTypeEnum.DELIMITER_TERMINATED.value)
         header_termination_sequence = os.environ.get('HEADER_TERMINATION_SEQUENCE', '\r\n\r\n')
+        read_budget_bytes = int(os.environ.get('READ_BUDGET_BYTES', 65536))
+        write_budget_bytes = int(os.environ.get('WRITE_BUDGET_BYTES', 65536))
+        max_connections = int(os.environ['MAX_CONNECTIONS']) if os.environ.get('MAX_CONNECTIONS') else None
+        accept_rate_limit = float(os.environ['ACCEPT_RATE_LIMIT']) if os.environ.get('ACCEPT_RATE_LIMIT') else None
+        accept_burst = int(os.environ.get('ACCEPT_BURST', 100))
+        per_client_rate_limit = float(os.environ['PER_CLIENT_RATE_LIMIT']) if os.environ.get('PER_CLIENT_RATE_LIMIT') else None
+        per_client_burst = int(os.environ.get('PER_CLIENT_BURST', 10))
+        max_queue_depth = int(os.environ['MAX_QUEUE_DEPTH']) if os.environ.get('MAX_QUEUE_DEPTH') else None
+        max_queue_latency = float(os.environ['MAX_QUEUE_LATENCY']) if os.environ.get('MAX_QUEUE_LATENCY') else None
+        busy_message = os.environ.get('BUSY_MESSAGE', '!BUSY')
+        max_datagram_size = int(os.environ.get('MAX_DATAGRAM_SIZE', 65507))
+        datagram_batch_size = int(os.environ.get('DATAGRAM_BATCH_SIZE', 32))
+        max_message_size = int(os.environ.get('MAX_MESSAGE_SIZE', 128 * 1024 * 1024))
 
         return cls(
             header_length=header_length,
@@ -90,4 +145,17 @@ class TcpSettings():
             blocking_mode=blocking_mode,
             header_type=header_type,
             header_termination_sequence=header_termination_sequence,
+            read_budget_bytes=read_budget_bytes,
+            write_budget_bytes=write_budget_bytes,
+            max_connections=max_connections,
+            accept_rate_limit=accept_rate_limit,
+            accept_burst=accept_burst,
+            per_client_rate_limit=per_client_rate_limit,
+            per_client_burst=per_client_burst,
+            max_queue_depth=max_queue_depth,
+            max_queue_latency=max_queue_latency,
+            busy_message=busy_message,
+            max_datagram_size=max_datagram_size,
+            datagram_batch_size=datagram_batch_size,
+            max_message_size=max_message_size,
         )
\ No newline at end of file
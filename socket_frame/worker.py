@@ -1,42 +1,92 @@
-from collections import deque
 from email.generator import Generator
 from logging import getLogger
 
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Optional, Tuple
 import errno
-import json
 import socket
 
-from .constants import CurrentOperationEnum, HeaderTypeEnum, MessagePartsEnum
-from .message_create import make_message
+from .buffer_pool import BufferPool
+from .constants import CurrentOperationEnum, HeaderTypeEnum
+from .message_create import make_message_parts
+from .message_parse import parse_message
 from .header import get_message_length_from_header
+from .recorder import TrafficRecorder
 from .settings import TcpSettings
-from .exceptions import OnMessageEffectNotSet, UnexpectedSocketError, SocketNotReadyYetTryAgainException, SocketIsClosed
+from .exceptions import (
+    MessageExceedsMaxSize, MessageLengthExceedsHeaderCapacity, OnMessageEffectNotSet, UnexpectedSocketError,
+    SocketNotReadyYetTryAgainException, SocketIsClosed,
+)
 
 
 logger = getLogger(__name__)
 
 
+def _acquire_buffer(buffer_pool: Optional[BufferPool], size: int) -> bytearray:
+    return buffer_pool.acquire(size) if buffer_pool is not None else bytearray(size)
+
+
+def _release_buffer(buffer_pool: Optional[BufferPool], buffer: bytearray) -> None:
+    if buffer_pool is not None:
+        buffer_pool.release(buffer)
+
+
+def _take_pending(view: memoryview, filled: int, pending: bytes) -> Tuple[int, bytes]:
+    '''copies what fits of bytes received earlier into view, returns new filled length and the rest of pending'''
+    taken = min(len(pending), len(view) - filled)
+    view[filled:filled + taken] = pending[:taken]
+    return filled + taken, pending[taken:]
+
+
+def _check_message_length(msg_length: int, settings: TcpSettings) -> None:
+    # checked before payload buffer is allocated for a length which only the peer vouches for
+    if msg_length > settings.MAX_MESSAGE_SIZE:
+        raise MessageExceedsMaxSize(f'header announces {msg_length} bytes, limit is {settings.MAX_MESSAGE_SIZE}')
+
+
+def _split_pending_header(pending: bytes, termination_sequence_bytes: bytes) -> Optional[Tuple[bytes, bytes]]:
+    '''header and the rest if bytes received with previous message already hold a whole header'''
+    found = pending.find(termination_sequence_bytes)
+    if found == -1:
+        return None
+    return pending[:found], pending[found + len(termination_sequence_bytes):]
+
+
 class Worker():
     '''
     worker for a blocking socket
     executes sending message for client and lets handler interact with message by injecting its effect as self._on_message
     '''
-    def __init__(self, connection: socket, settings: TcpSettings):
+    __slots__ = (
+        'conn', 'settings', '_on_message', '_on_connect', '_received_buffer', '_recorder', '_connection_id', '_buffer_pool',
+    )
+
+    def __init__(
+        self,
+        connection: socket,
+        settings: TcpSettings,
+        recorder: Optional[TrafficRecorder] = None,
+        buffer_pool: Optional[BufferPool] = None,
+    ):
         self.conn = connection
 
         self.settings = settings
         self._on_message = None
         self._on_connect = None
-        self._received_buffer = deque([])
+        # bytes already received but not consumed yet, empty bytes is a shared singleton
+        self._received_buffer = b''
+        self._recorder = recorder
+        self._connection_id = recorder.register_connection() if recorder is not None else None
+        self._buffer_pool = buffer_pool
 
     def send_message(self, msg):
         '''method which can be called only by related handler'''
-        length_sent = 0
-        message_to_send = make_message(msg, self.settings)
-        logger.debug('sending message %s', message_to_send)
-        while length_sent < len(message_to_send):
-            length_sent += self.conn.send(message_to_send[length_sent:])
+        message_parts = make_message_parts(msg, self.settings)
+        logger.debug('sending message %s', message_parts)
+        for part in message_parts:
+            part_view = memoryview(part)
+            length_sent = 0
+            while length_sent < len(part_view):
+                length_sent += self.conn.send(part_view[length_sent:])
     
     def on_connect(self):
         if self._on_connect is None:
@@ -58,7 +108,11 @@ class Worker():
 
     def disconnect(self):
         #self.conn.send(self.settings.DISCONNECT_MESSAGE)
-        self.conn.shutdown(1)
+        try:
+            self.conn.shutdown(1)
+        except OSError:
+            # peer has already closed connection, e.g. server rejected it as busy
+            pass
         self.conn.close()
     
     def run(self):
@@ -73,53 +127,73 @@ class Worker():
     
     def get_next_message(self):
         if self.settings.HEADER_TYPE is HeaderTypeEnum.FIXED_LENGTH:
-            header = self._receive_defined_length(self, self.settings.HEADER_LENGTH)
+            msg_length = self._receive_fixed_length_header()
         elif self.settings.HEADER_TYPE is HeaderTypeEnum.DELIMITER_TERMINATED:
-            header = self._receive_until_termination_sequence()
+            msg_length = self._receive_until_termination_sequence()
         else:
             raise NotImplementedError
-        logger.debug('got header: %s', header)
-        msg_length = get_message_length_from_header(header, settings=self.settings)
         logger.debug('got msg_len: %s', msg_length)
+        _check_message_length(msg_length, self.settings)
         msg =self._receive_defined_length(msg_length)
         logger.debug('got msg: %s', msg)
-        message_parsed = json.loads(msg.decode())
+        if self._recorder is not None:
+            self._recorder.record(self._connection_id, msg)
+        message_parsed = parse_message(msg, self.settings)
         return message_parsed
     
-    def _receive_defined_length(self, length: int):
-        collected = b''
-        while len(collected) < length:
-            if self._received_buffer:
-                collected += self._received_buffer.popleft()
-            else:
-                collected += self.conn.recv(length - len(collected))
-        
-        if len(collected) > length:
+    def _receive_fixed_length_header(self) -> int:
+        # header is parsed right from a pooled buffer of header length, nothing is copied
+        header = _acquire_buffer(self._buffer_pool, self.settings.HEADER_LENGTH)
+        try:
+            self._receive_into(memoryview(header))
+            return get_message_length_from_header(header, settings=self.settings)
+        finally:
+            _release_buffer(self._buffer_pool, header)
+
+    def _receive_defined_length(self, length: int) -> bytearray:
+        # received straight into the final buffer: no concatenation, parsed ndarray can share its memory
+        collected = bytearray(length)
+        self._receive_into(memoryview(collected))
+        return collected
+
+    def _receive_into(self, view: memoryview) -> None:
+        filled = 0
+        while filled < len(view):
             if self._received_buffer:
-                # if buffer still contains chunks of next msgs, e.g. this part was from buffer
-                self._received_buffer.appendleft(collected[length:])
+                filled, self._received_buffer = _take_pending(view, filled, self._received_buffer)
             else:
-                self._received_buffer.append(collected[length:])
-        return collected
+                received = self.conn.recv_into(view[filled:])
+                if not received:
+                    raise SocketIsClosed
+                filled += received
     
-    def _receive_until_termination_sequence(self):
-        collected = b''
+    def _receive_until_termination_sequence(self) -> int:
         termination_sequence_bytes = self.settings.HEADER_TERMINATION_SEQUENCE.encode(self.settings.MSG_FORMAT)
-        while termination_sequence_bytes not in collected:
-            if self._received_buffer:
-                collected += self._received_buffer.popleft()
-            else:
-                collected += self.conn.recv(self.settings.BYTES_CHUNK_SIZE)
-        
-        # we cannot be sure how many messages we have received (e.g. for ws-like we could have more than one)
-        required, remaining = collected.split(termination_sequence_bytes, 1)
-        if remaining:
-            if self._received_buffer:
-                # similar logic: we could take this from buffer, not from conn
-                self._received_buffer.appendleft(remaining)
-            else:
-                self._received_buffer.append(remaining)
-        return required
+        split = _split_pending_header(self._received_buffer, termination_sequence_bytes)
+        if split is not None:
+            header, self._received_buffer = split
+            return get_message_length_from_header(header, settings=self.settings)
+        # received into a pooled chunk buffer and searched in place, only header digits and the rest are copied
+        buffer = _acquire_buffer(self._buffer_pool, self.settings.BYTES_CHUNK_SIZE)
+        try:
+            view = memoryview(buffer)
+            filled, self._received_buffer = _take_pending(view, 0, self._received_buffer)
+            found = -1
+            while found == -1:
+                if filled == len(buffer):
+                    raise MessageLengthExceedsHeaderCapacity
+                received = self.conn.recv_into(view[filled:])
+                if not received:
+                    raise SocketIsClosed
+                # termination sequence could be split between two recvs
+                search_from = max(filled - len(termination_sequence_bytes) + 1, 0)
+                filled += received
+                found = buffer.find(termination_sequence_bytes, search_from, filled)
+            # we cannot be sure how many messages we have received (e.g. for ws-like we could have more than one)
+            self._received_buffer = bytes(view[found + len(termination_sequence_bytes):filled])
+            return get_message_length_from_header(buffer[:found], settings=self.settings)
+        finally:
+            _release_buffer(self._buffer_pool, buffer)
 
 
 
@@ -129,40 +203,61 @@ class GeneratorWorker():
     worker for a blocking/nonblocking tcp socket as generator
     executes sending message for client and lets handler interact with message by injecting its effect as self._on_message
     '''
-    def __init__(self, connection: socket, settings: TcpSettings):
+    __slots__ = (
+        'conn', 'settings', '_on_message', '_on_connect', '_received_buffer', '_recorder', '_connection_id', '_buffer_pool',
+        '_current_message', '_current_parsed_message', 'current_operation', 'bytes_received', 'bytes_sent',
+    )
+
+    def __init__(
+        self,
+        connection: socket,
+        settings: TcpSettings,
+        recorder: Optional[TrafficRecorder] = None,
+        buffer_pool: Optional[BufferPool] = None,
+    ):
         self.conn = connection
 
         self.settings = settings
         self._on_message = None
         self._on_connect = None
-        self._received_buffer = deque([])
-        self._current_header: Optional[bytes] = None
+        # bytes already received but not consumed yet, empty bytes is a shared singleton
+        self._received_buffer = b''
+        self._recorder = recorder
+        self._connection_id = recorder.register_connection() if recorder is not None else None
+        self._buffer_pool = buffer_pool
         self._current_message: Optional[bytes] = None
-        self.current_parsed_message: Optional[Any] = None
+        self._current_parsed_message: Optional[Any] = None
         self.current_operation = CurrentOperationEnum.NO_OPERATION
+        # running totals, used by scheduler to enforce per-turn budgets
+        self.bytes_received = 0
+        self.bytes_sent = 0
     
     def get_message_and_clear(self):
-        self._current_header = None
         self._current_message = None
-        msg_to_return = self.current_parsed_message
-        self.current_parsed_message = None
+        msg_to_return = self._current_parsed_message
+        self._current_parsed_message = None
         return msg_to_return
 
     def send_message(self, msg):
         self.current_operation = CurrentOperationEnum.WRITING
         '''method which can be called only by related handler'''
-        length_sent = 0
-        message_to_send = make_message(msg, self.settings)
-        logger.debug('sending message %s', message_to_send)
-        while length_sent < len(message_to_send):
-            try:
-                length_sent += self.conn.send(message_to_send[length_sent:])
-            except socket.error as e:
-                if e.args[0] in [errno.EWOULDBLOCK, errno.EAGAIN]:
-                    yield
-                else:
-                    raise UnexpectedSocketError(e)
-            yield
+        message_parts = make_message_parts(msg, self.settings)
+        logger.debug('sending message %s', message_parts)
+        for part in message_parts:
+            part_view = memoryview(part)
+            length_sent = 0
+            while length_sent < len(part_view):
+                try:
+                    # capped, so one step cannot send far beyond the per-turn write budget of scheduler
+                    just_sent = self.conn.send(part_view[length_sent:length_sent + self.settings.BYTES_CHUNK_SIZE])
+                    length_sent += just_sent
+                    self.bytes_sent += just_sent
+                except socket.error as e:
+                    if e.args[0] in [errno.EWOULDBLOCK, errno.EAGAIN]:
+                        yield
+                    else:
+                        raise UnexpectedSocketError(e)
+                yield
     
     def on_connect(self):
         if self._on_connect is None:
@@ -193,88 +288,119 @@ class GeneratorWorker():
         while True:
             try:
                 yield from self.get_next_message()
-                yield from self.on_message(self._current_parsed_message)
+                # handed over and cleared, idle connection does not keep the last message alive
+                yield from self.on_message(self.get_message_and_clear())
             except socket.timeout:
                 self.disconnect()
     
     def get_next_message(self):
         self.current_operation = CurrentOperationEnum.READING
-        self._current_header = None
         self._current_message = None
         if self.settings.HEADER_TYPE is HeaderTypeEnum.FIXED_LENGTH:
-            yield from self._receive_defined_length(self.settings.HEADER_LENGTH, MessagePartsEnum.HEADER)
+            msg_length = yield from self._receive_fixed_length_header()
         elif self.settings.HEADER_TYPE is HeaderTypeEnum.DELIMITER_TERMINATED:
-            yield from self._receive_until_termination_sequence(MessagePartsEnum.HEADER)
-        logger.debug('got header: %s', self._current_header)
-        msg_length = get_message_length_from_header(self._current_header, settings=self.settings)
+            msg_length = yield from self._receive_until_termination_sequence()
+        else:
+            raise NotImplementedError
         logger.debug('got msg_len: %s', msg_length)
-        yield from self._receive_defined_length(msg_length, MessagePartsEnum.PAYLOAD)
+        _check_message_length(msg_length, self.settings)
+        self._current_message = yield from self._receive_defined_length(msg_length)
         logger.debug('got msg: %s', self._current_message)
-        message_parsed = json.loads(self._current_message.decode())
+        if self._recorder is not None:
+            self._recorder.record(self._connection_id, self._current_message)
+        message_parsed = parse_message(self._current_message, self.settings)
         self._current_parsed_message = message_parsed
-    
-    def _receive_defined_length(self, length: int, collect_as: MessagePartsEnum):
-        collected = b''
-        while len(collected) < length:
-            if self._received_buffer:
-                collected += self._received_buffer.popleft()
-            else:
-                try:
-                    collected += self.conn.recv(length - len(collected))
-                    yield
-                except socket.error as e:
-                    if e.args[0] == errno.EWOULDBLOCK: 
-                        yield
-                    else:
-                        raise UnexpectedSocketError(e)
-        
-        if len(collected) > length:
-            if self._received_buffer:
-                # if buffer still contains chunks of next msgs
-                self._received_buffer.appendleft(collected[length:])
-            else:
-                self._received_buffer.append(collected[length:])
+        self._current_message = None
 
-        if collect_as is MessagePartsEnum.HEADER:
-            self._current_header = collected[:length]
-        elif collect_as is MessagePartsEnum.PAYLOAD:
-            self._current_message = collected[:length]
-        else:
-            raise NotImplementedError
+    def _recv_into(self, view: memoryview) -> Optional[int]:
+        '''number of bytes received (at most one chunk, to respect per-turn read budget), None if socket would block'''
+        try:
+            received = self.conn.recv_into(view[:self.settings.BYTES_CHUNK_SIZE])
+        except socket.error as e:
+            if e.args[0] == errno.EWOULDBLOCK:
+                return None
+            raise UnexpectedSocketError(e)
+        if not received:
+            self.conn.shutdown(1)
+            self.conn.close()
+            raise SocketIsClosed
+        self.bytes_received += received
+        return received
 
-    def _receive_until_termination_sequence(self, collect_as: MessagePartsEnum):
-        collected = b''
-        termination_sequence_bytes = self.settings.HEADER_TERMINATION_SEQUENCE.encode(self.settings.MSG_FORMAT)
-        while termination_sequence_bytes not in collected:
-            if self._received_buffer:
-                collected += self._received_buffer.popleft()
-            else:
-                try:
-                    added_part = self.conn.recv(self.settings.BYTES_CHUNK_SIZE)
-                    if not added_part:
-                        self.conn.shutdown(1)
-                        self.conn.close()
-                        raise SocketIsClosed
-                    else:
-                        collected += added_part
-                except socket.error as e:
-                    if e.args[0] == errno.EWOULDBLOCK:
-                        yield
-                    else:
-                        raise UnexpectedSocketError(e)
-        
-        # we cannot be sure how many messages we have received (e.g. for ws-like we could have more than one)
-        required, remaining = collected.split(termination_sequence_bytes, 1)
-        
-        if remaining:
+    def _receive_fixed_length_header(self):
+        # header is parsed right from a pooled buffer of header length, nothing is copied
+        length = self.settings.HEADER_LENGTH
+        header = None
+        filled = 0
+        try:
+            while filled < length:
+                if header is None:
+                    header = _acquire_buffer(self._buffer_pool, length)
+                    view = memoryview(header)
+                if self._received_buffer:
+                    filled, self._received_buffer = _take_pending(view, filled, self._received_buffer)
+                    continue
+                received = self._recv_into(view[filled:])
+                if received is not None:
+                    filled += received
+                elif not filled:
+                    # idle connection waits for its next message without holding a pooled buffer
+                    _release_buffer(self._buffer_pool, header)
+                    header = None
+                yield
+            return get_message_length_from_header(header, settings=self.settings)
+        finally:
+            if header is not None:
+                _release_buffer(self._buffer_pool, header)
+
+    def _receive_defined_length(self, length: int):
+        # received straight into the final buffer: no concatenation, parsed ndarray can share its memory
+        collected = bytearray(length)
+        collected_view = memoryview(collected)
+        filled = 0
+        while filled < length:
             if self._received_buffer:
-                # similar logic: we could take this from buffer, not from conn
-                self._received_buffer.appendleft(remaining)
+                filled, self._received_buffer = _take_pending(collected_view, filled, self._received_buffer)
             else:
-                self._received_buffer.append(remaining)
-        if collect_as is MessagePartsEnum.HEADER:
-            self._current_header = required
-        elif collect_as is MessagePartsEnum.PAYLOAD:
-            self._current_message = required
-        else:
-            raise NotImplementedError
+                received = self._recv_into(collected_view[filled:])
+                if received is not None:
+                    filled += received
+                yield
+        return collected
+
+    def _receive_until_termination_sequence(self):
+        termination_sequence_bytes = self.settings.HEADER_TERMINATION_SEQUENCE.encode(self.settings.MSG_FORMAT)
+        split = _split_pending_header(self._received_buffer, termination_sequence_bytes)
+        if split is not None:
+            header, self._received_buffer = split
+            return get_message_length_from_header(header, settings=self.settings)
+        # received into a pooled chunk buffer and searched in place, only header digits and the rest are copied
+        buffer = None
+        filled = 0
+        found = -1
+        try:
+            while found == -1:
+                if buffer is None:
+                    buffer = _acquire_buffer(self._buffer_pool, self.settings.BYTES_CHUNK_SIZE)
+                    view = memoryview(buffer)
+                    filled, self._received_buffer = _take_pending(view, 0, self._received_buffer)
+                if filled == len(buffer):
+                    raise MessageLengthExceedsHeaderCapacity
+                received = self._recv_into(view[filled:])
+                if received is None:
+                    if not filled:
+                        # idle connection waits for its next message without holding a pooled buffer
+                        _release_buffer(self._buffer_pool, buffer)
+                        buffer = None
+                    yield
+                    continue
+                # termination sequence could be split between two recvs
+                search_from = max(filled - len(termination_sequence_bytes) + 1, 0)
+                filled += received
+                found = buffer.find(termination_sequence_bytes, search_from, filled)
+            # we cannot be sure how many messages we have received (e.g. for ws-like we could have more than one)
+            self._received_buffer = bytes(view[found + len(termination_sequence_bytes):filled])
+            return get_message_length_from_header(buffer[:found], settings=self.settings)
+        finally:
+            if buffer is not None:
+                _release_buffer(self._buffer_pool, buffer)
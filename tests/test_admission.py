@@ -0,0 +1,83 @@
+import socket
+
+import pytest
+
+from socket_frame import admission
+from socket_frame.admission import AdmissionController
+from socket_frame.message_create import make_message
+from socket_frame.settings import TcpSettings
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(admission, 'monotonic', fake_clock)
+    return fake_clock
+
+
+def make_controller(**kwargs) -> AdmissionController:
+    return AdmissionController(TcpSettings(server_address='127.0.0.1', **kwargs))
+
+
+def test_connection_over_limit_gets_busy_frame_and_slot_is_freed_on_release():
+    controller = make_controller(max_connections=1)
+    assert controller.admit(('10.0.0.1', 1000))
+    assert not controller.admit(('10.0.0.2', 1000))
+
+    server_side, client_side = socket.socketpair()
+    with client_side:
+        controller.reject(server_side)
+        assert server_side.fileno() == -1
+        busy_frame = make_message(controller.settings.BUSY_MESSAGE, controller.settings)
+        assert client_side.recv(1024) == busy_frame
+        assert client_side.recv(1024) == b''
+
+    controller.release()
+    assert controller.admit(('10.0.0.2', 1000))
+    assert controller.rejected_connections == 1
+
+
+def test_accept_rate_limit_rejects_after_burst_and_refills(clock):
+    controller = make_controller(accept_rate_limit=10, accept_burst=2)
+    assert controller.admit(('10.0.0.1', 1000))
+    assert controller.admit(('10.0.0.2', 1000))
+    assert not controller.admit(('10.0.0.3', 1000))
+
+    clock.now += 0.1
+    assert controller.admit(('10.0.0.3', 1000))
+    assert not controller.admit(('10.0.0.4', 1000))
+
+
+def test_per_client_rate_limit_is_kept_per_ip(clock):
+    controller = make_controller(per_client_rate_limit=1, per_client_burst=2)
+    assert controller.admit(('10.0.0.1', 1000))
+    assert controller.admit(('10.0.0.1', 1001))
+    assert not controller.admit(('10.0.0.1', 1002))
+    # other clients have their own bucket
+    assert controller.admit(('10.0.0.2', 1000))
+
+    clock.now += 1
+    assert controller.admit(('10.0.0.1', 1003))
+    assert not controller.admit(('10.0.0.1', 1004))
+
+
+def test_pruning_drops_only_fully_refilled_buckets(clock):
+    controller = make_controller(per_client_rate_limit=1, per_client_burst=2)
+    controller.MAX_TRACKED_CLIENTS = 2
+    controller.admit(('10.0.0.1', 1000))
+    controller.admit(('10.0.0.1', 1001))
+    controller.admit(('10.0.0.2', 1000))
+    clock.now += 1
+    # 10.0.0.1 has refilled one of two tokens, 10.0.0.2 is full again
+
+    controller.admit(('10.0.0.3', 1000))
+
+    assert set(controller._client_buckets) == {'10.0.0.1', '10.0.0.3'}
@@ -0,0 +1,23 @@
+import socket
+
+from socket_frame.datagram import DatagramWorker, _parse_datagram
+from socket_frame.handler import run_echo_async
+from socket_frame.settings import TcpSettings
+
+
+def test_generator_handler_replies():
+    settings = TcpSettings(server_address='127.0.0.1', socket_timeout=1)
+    server_side = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    with server_side, peer:
+        server_side.bind(('127.0.0.1', 0))
+        peer.bind(('127.0.0.1', 0))
+        peer.settimeout(settings.SOCKET_TIMEOUT)
+        worker = DatagramWorker(server_side, settings)
+        run_echo_async(worker, settings=settings)
+
+        worker.on_message({'n': 1}, peer.getsockname())
+
+        buffer = bytearray(settings.MAX_DATAGRAM_SIZE)
+        length, _ = peer.recvfrom_into(buffer)
+        assert _parse_datagram(buffer, length, settings) == {'n': 1}
@@ -0,0 +1,123 @@
+from threading import Thread
+from time import monotonic
+import socket
+
+import pytest
+
+from socket_frame.client import MultiClient
+from socket_frame.handler import run_echo
+from socket_frame.settings import TcpSettings
+from socket_frame.worker import Worker
+
+
+SETTINGS = TcpSettings(server_address='127.0.0.1', socket_timeout=2)
+
+
+def listening_socket() -> socket.socket:
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    return server
+
+
+def echo(conn: socket.socket) -> None:
+    with conn:
+        try:
+            run_echo(Worker(conn, settings=SETTINGS), settings=SETTINGS)
+        except Exception:
+            # client went away
+            pass
+
+
+@pytest.fixture
+def echo_server():
+    server = listening_socket()
+    accepted = []
+
+    def accept_forever():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            accepted.append(conn)
+            Thread(target=echo, args=(conn,), daemon=True).start()
+
+    Thread(target=accept_forever, daemon=True).start()
+    yield server.getsockname(), accepted
+    server.close()
+
+
+@pytest.fixture
+def silent_server():
+    # kernel completes connections from backlog, nobody ever reads or replies
+    server = listening_socket()
+    yield server.getsockname()
+    server.close()
+
+
+@pytest.fixture
+def refusing_target():
+    unused = socket.socket()
+    unused.bind(('127.0.0.1', 0))
+    address = unused.getsockname()
+    unused.close()
+    return address
+
+
+def test_partial_result_on_deadline(echo_server, silent_server):
+    echo_address, _ = echo_server
+    client = MultiClient([echo_address, silent_server], settings=SETTINGS)
+    with client.connect():
+        started = monotonic()
+        results = client.broadcast({'n': 1}, timeout=0.3)
+        elapsed = monotonic() - started
+
+    assert results == {echo_address: {'n': 1}}
+    assert 0.3 <= elapsed < 1.0
+
+
+def test_refused_target_is_missing_from_results(echo_server, refusing_target):
+    echo_address, _ = echo_server
+    client = MultiClient([echo_address, refusing_target], settings=SETTINGS)
+    with client.connect():
+        results = client.scatter({echo_address: 'a', refusing_target: 'b'}, timeout=1)
+
+    assert results == {echo_address: 'a'}
+
+
+def test_connection_is_reused_across_scatter_calls(echo_server):
+    echo_address, accepted = echo_server
+    client = MultiClient([echo_address], settings=SETTINGS)
+    with client.connect():
+        first = client.scatter({echo_address: 'first'}, timeout=1)
+        second = client.scatter({echo_address: 'second'}, timeout=1)
+
+    assert first == {echo_address: 'first'}
+    assert second == {echo_address: 'second'}
+    assert len(accepted) == 1
+
+
+def test_target_missing_deadline_is_reconnected_on_next_call():
+    server = listening_socket()
+    accepted = []
+
+    def ignore_first_connection_then_echo():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            accepted.append(conn)
+            if len(accepted) > 1:
+                Thread(target=echo, args=(conn,), daemon=True).start()
+
+    Thread(target=ignore_first_connection_then_echo, daemon=True).start()
+    address = server.getsockname()
+    client = MultiClient([address], settings=SETTINGS)
+    with client.connect(), server:
+        assert client.broadcast('lost', timeout=0.3) == {}
+        # framing state of the late connection is unknown, so a fresh one is opened
+        assert client.broadcast('again', timeout=1) == {address: 'again'}
+
+    assert len(accepted) == 2
@@ -0,0 +1,21 @@
+import pytest
+
+from socket_frame.message_create import make_message
+from socket_frame.message_parse import parse_message
+from socket_frame.settings import TcpSettings
+
+
+np = pytest.importorskip('numpy')
+
+
+def test_structured_dtype_round_trip():
+    settings = TcpSettings(server_address='127.0.0.1')
+    array = np.zeros(3, dtype=[('a', 'i4'), ('b', 'f8')])
+    array['a'] = [1, 2, 3]
+    termination_sequence = settings.HEADER_TERMINATION_SEQUENCE.encode(settings.MSG_FORMAT)
+
+    message = make_message(array, settings)
+    parsed = parse_message(bytearray(message.split(termination_sequence, 1)[1]), settings)
+
+    assert parsed.dtype == array.dtype
+    assert (parsed == array).all()
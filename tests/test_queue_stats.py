@@ -0,0 +1,19 @@
+from time import sleep
+
+from socket_frame.queue_stats import QueueStats
+
+
+def test_oldest_wait_grows_while_nothing_starts():
+    stats = QueueStats()
+    first = stats.enqueued()
+    sleep(0.05)
+    second = stats.enqueued()
+
+    assert stats.oldest_wait() >= 0.05
+    # items may start out of order, the oldest one is still waiting
+    stats.started(second)
+    assert stats.depth == 1
+    assert stats.oldest_wait() >= 0.05
+    stats.started(first)
+    assert stats.depth == 0
+    assert stats.oldest_wait() == 0.0
@@ -0,0 +1,86 @@
+from base64 import b64encode
+from threading import Thread
+import json
+import socket
+
+import pytest
+
+from socket_frame.message_create import make_message
+from socket_frame.recorder import TrafficRecorder, read_recording
+from socket_frame.replay import TrafficReplayer
+from socket_frame.settings import TcpSettings
+from socket_frame.worker import GeneratorWorker
+
+
+def write_recording(path, frames_count: int) -> None:
+    '''frames 0.02s apart, alternating between two connections'''
+    with open(path, 'w') as recording_file:
+        for i in range(frames_count):
+            payload = b64encode(b'"x"').decode('ascii')
+            recording_file.write(json.dumps({'ts': i * 0.02, 'conn': i % 2, 'payload': payload}) + '\n')
+
+
+@pytest.mark.parametrize('speed', [0, -1.0])
+def test_speed_has_to_be_positive(speed):
+    with pytest.raises(ValueError):
+        TrafficReplayer(TcpSettings(server_address='127.0.0.1'), speed=speed)
+
+
+def test_frames_of_hung_up_connection_are_dropped(tmp_path):
+    recording = tmp_path / 'recording.jsonl'
+    write_recording(recording, 10)
+
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+
+    def hang_up_after_first_frame():
+        while True:
+            conn, _ = server.accept()
+            conn.recv(100)
+            conn.close()
+
+    Thread(target=hang_up_after_first_frame, daemon=True).start()
+    settings = TcpSettings(server_address='127.0.0.1', port=server.getsockname()[1])
+
+    stats = TrafficReplayer(settings, speed=1.0).replay(str(recording))
+
+    assert stats.frames_sent + stats.frames_dropped == 10
+    assert stats.frames_dropped >= 6
+    server.close()
+
+
+def test_frames_of_refused_connections_are_dropped(tmp_path):
+    recording = tmp_path / 'recording.jsonl'
+    write_recording(recording, 4)
+    unused = socket.socket()
+    unused.bind(('127.0.0.1', 0))
+    settings = TcpSettings(server_address='127.0.0.1', port=unused.getsockname()[1])
+    unused.close()
+
+    stats = TrafficReplayer(settings, speed=None).replay(str(recording))
+
+    assert stats.frames_sent == 0
+    assert stats.frames_dropped == 4
+
+
+def test_frames_recorded_by_worker_are_read_back(tmp_path):
+    settings = TcpSettings(server_address='127.0.0.1')
+    messages = [{'n': 1}, 'second']
+    recording = tmp_path / 'recording.jsonl'
+    reader, writer = socket.socketpair()
+    with TrafficRecorder(str(recording)) as recorder, reader, writer:
+        worker = GeneratorWorker(reader, settings=settings, recorder=recorder)
+        for message in messages:
+            writer.sendall(make_message(message, settings))
+            for _ in worker.get_next_message():
+                pass
+
+    frames = list(read_recording(str(recording)))
+
+    termination_sequence = settings.HEADER_TERMINATION_SEQUENCE.encode(settings.MSG_FORMAT)
+    assert [frame.payload for frame in frames] == [
+        make_message(message, settings).split(termination_sequence, 1)[1] for message in messages
+    ]
+    assert [frame.connection_id for frame in frames] == [0, 0]
+    assert frames[0].timestamp <= frames[1].timestamp
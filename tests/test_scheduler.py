@@ -0,0 +1,160 @@
+from threading import Thread
+import socket
+
+from socket_frame.constants import CurrentOperationEnum
+from socket_frame.handler import run_echo_async
+from socket_frame.message_create import make_message
+from socket_frame.scheduler import FairScheduler
+from socket_frame.settings import TcpSettings
+from socket_frame.worker import GeneratorWorker
+
+
+class FakeWorker():
+    def __init__(self):
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.current_operation = CurrentOperationEnum.READING
+
+
+def flooding_task(worker: FakeWorker, chunk: int):
+    while True:
+        worker.bytes_received += chunk
+        yield
+
+
+def make_scheduler(**kwargs) -> FairScheduler:
+    settings = TcpSettings(server_address='127.0.0.1', read_budget_bytes=100, write_budget_bytes=100)
+    return FairScheduler(settings, **kwargs)
+
+
+def run_one_pass(scheduler: FairScheduler) -> list:
+    with scheduler._condition:
+        current_pass = scheduler._take_pass()
+    for task, enqueue_token in current_pass:
+        scheduler._run_turn(task, enqueue_token)
+    return [task for task, _ in current_pass]
+
+
+def test_task_marked_ready_before_its_turn_is_queued_once():
+    scheduler = make_scheduler(requeue_after_turn=False)
+    worker = FakeWorker()
+    task = flooding_task(worker, 60)
+    scheduler.add(task, worker)
+
+    with scheduler._condition:
+        current_pass = scheduler._take_pass()
+    # select thread reports the socket again after pass was taken, before the task had its turn
+    scheduler.mark_ready(task)
+    for queued_task, enqueue_token in current_pass:
+        # turn spends the read budget, so the task is requeued after it
+        scheduler._run_turn(queued_task, enqueue_token)
+
+    assert scheduler.pending_count() == 1
+    assert run_one_pass(scheduler) == [task]
+
+
+def test_one_failing_task_does_not_stop_others():
+    finished = []
+    scheduler = make_scheduler(requeue_after_turn=True, on_finished=lambda task, worker: finished.append(task))
+
+    def failing_task(worker):
+        worker.bytes_received += 1
+        yield
+        raise ValueError('malformed header')
+
+    healthy_worker, failing_worker = FakeWorker(), FakeWorker()
+    healthy = flooding_task(healthy_worker, 10)
+    failing = failing_task(failing_worker)
+    scheduler.add(healthy, healthy_worker)
+    scheduler.add(failing, failing_worker)
+
+    run_one_pass(scheduler)
+    run_one_pass(scheduler)
+
+    assert finished == [failing]
+    assert run_one_pass(scheduler) == [healthy]
+
+
+def test_higher_priority_gets_bigger_budget_share():
+    scheduler = make_scheduler(requeue_after_turn=True)
+    low_worker, high_worker = FakeWorker(), FakeWorker()
+    scheduler.add(flooding_task(low_worker, 10), low_worker, priority=0)
+    scheduler.add(flooding_task(high_worker, 10), high_worker, priority=2)
+
+    run_one_pass(scheduler)
+
+    assert low_worker.bytes_received == 100
+    assert high_worker.bytes_received == 300
+
+
+def test_task_blocked_on_send_waits_for_writability():
+    blocked = []
+    scheduler = make_scheduler(
+        requeue_after_turn=False, on_blocked_on_send=lambda task, worker: blocked.append(task))
+
+    def slow_reader_task(worker):
+        worker.current_operation = CurrentOperationEnum.WRITING
+        while True:
+            # peer does not read, send would block
+            yield
+
+    worker = FakeWorker()
+    task = slow_reader_task(worker)
+    scheduler.add(task, worker)
+
+    run_one_pass(scheduler)
+
+    assert blocked == [task]
+    assert scheduler.pending_count() == 0
+    scheduler.mark_ready(task)
+    assert run_one_pass(scheduler) == [task]
+
+
+def test_idle_polled_task_is_not_counted_in_queue_stats():
+    scheduler = make_scheduler(requeue_after_turn=True)
+
+    def idle_task(worker):
+        while True:
+            # socket would block, nothing received
+            yield
+
+    worker = FakeWorker()
+    scheduler.add(idle_task(worker), worker)
+    assert scheduler.queue_stats.depth == 1
+
+    run_one_pass(scheduler)
+
+    assert scheduler.pending_count() == 1
+    assert scheduler.queue_stats.depth == 0
+
+
+def test_turn_on_real_socket_stays_within_budget():
+    settings = TcpSettings(server_address='127.0.0.1', read_budget_bytes=65536, write_budget_bytes=65536)
+    scheduler = FairScheduler(settings, requeue_after_turn=True)
+    message = make_message('x' * 4 * 1024 * 1024, settings)
+    server_side, client_side = socket.socketpair()
+    with server_side, client_side:
+        server_side.setblocking(False)
+        worker = GeneratorWorker(server_side, settings=settings)
+        scheduler.add(run_echo_async(worker, settings=settings), worker)
+        echoed = []
+
+        def echo_client():
+            client_side.sendall(message)
+            received = 0
+            while received < len(message):
+                chunk = client_side.recv(1 << 20)
+                echoed.append(chunk)
+                received += len(chunk)
+
+        client = Thread(target=echo_client, daemon=True)
+        client.start()
+        while worker.bytes_sent < len(message):
+            received_before, sent_before = worker.bytes_received, worker.bytes_sent
+            run_one_pass(scheduler)
+            # a turn stops within one chunk past its budget
+            assert worker.bytes_received - received_before < settings.READ_BUDGET_BYTES + settings.BYTES_CHUNK_SIZE
+            assert worker.bytes_sent - sent_before < settings.WRITE_BUDGET_BYTES + settings.BYTES_CHUNK_SIZE
+        client.join(timeout=5)
+
+    assert b''.join(echoed) == message
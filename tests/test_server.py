@@ -0,0 +1,54 @@
+from threading import Thread
+from time import monotonic, sleep
+import socket
+
+from socket_frame.constants import CurrentOperationEnum
+from socket_frame.handler import run_echo_async
+from socket_frame.message_create import make_message
+from socket_frame.server import SelectBasedServer
+from socket_frame.settings import TcpSettings
+
+
+def wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, 'condition not met in time'
+        sleep(0.01)
+
+
+def connect(address) -> socket.socket:
+    deadline = monotonic() + 5
+    while True:
+        try:
+            return socket.create_connection(address)
+        except ConnectionRefusedError:
+            # server thread is not listening yet
+            assert monotonic() < deadline
+            sleep(0.01)
+
+
+def test_slow_reader_with_queued_requests_does_not_spin():
+    settings = TcpSettings(server_address='127.0.0.1', port=0)
+    server = SelectBasedServer(settings, core_handler=run_echo_async)
+    turns = []
+    run_turn = server.scheduler._run_turn
+    server.scheduler._run_turn = lambda task, token: (turns.append(task), run_turn(task, token))
+    Thread(target=server.run, daemon=True).start()
+
+    slow_reader = connect(server.server.getsockname())
+    with slow_reader:
+        request = make_message('x' * 8 * 1024 * 1024, settings)
+        # second request stays unread on server side while echo of the first one is blocked
+        Thread(target=slow_reader.sendall, args=(request + request,), daemon=True).start()
+        wait_for(lambda: bool(server.scheduler._tasks))
+        (worker, _), = server.scheduler._tasks.values()
+        wait_for(lambda: worker.current_operation is CurrentOperationEnum.WRITING)
+        sent = -1
+        while sent != worker.bytes_sent:
+            sent = worker.bytes_sent
+            sleep(0.2)
+
+        turns_before = len(turns)
+        sleep(0.5)
+
+        assert len(turns) - turns_before <= 2
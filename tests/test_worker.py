@@ -0,0 +1,75 @@
+import socket
+
+import pytest
+
+from socket_frame.buffer_pool import BufferPool
+from socket_frame.constants import HeaderTypeEnum
+from socket_frame.exceptions import MessageExceedsMaxSize
+from socket_frame.message_create import make_message
+from socket_frame.settings import TcpSettings
+from socket_frame.worker import GeneratorWorker, Worker
+
+
+def make_settings(header_type: HeaderTypeEnum) -> TcpSettings:
+    return TcpSettings(server_address='127.0.0.1', header_type=header_type, bytes_chunk_size=64)
+
+
+def receive_with_generator_worker(worker: GeneratorWorker):
+    for _ in worker.get_next_message():
+        pass
+    return worker.get_message_and_clear()
+
+
+@pytest.mark.parametrize('header_type', list(HeaderTypeEnum))
+@pytest.mark.parametrize('worker_cls, receive', [
+    (Worker, Worker.get_next_message),
+    (GeneratorWorker, receive_with_generator_worker),
+])
+def test_pipelined_messages(header_type, worker_cls, receive):
+    settings = make_settings(header_type)
+    messages = [{'n': 1}, 'x' * 100, [2, 3]]
+    buffer_pool = BufferPool(settings.BYTES_CHUNK_SIZE)
+    reader, writer = socket.socketpair()
+    with reader, writer:
+        worker = worker_cls(reader, settings=settings, buffer_pool=buffer_pool)
+        writer.sendall(b''.join(make_message(message, settings) for message in messages))
+
+        assert [receive(worker) for _ in messages] == messages
+    # header buffers are returned, the one lent last is reused for every header
+    assert buffer_pool.pooled_count == 1
+
+
+@pytest.mark.parametrize('header_type', list(HeaderTypeEnum))
+def test_message_arriving_byte_by_byte(header_type):
+    settings = make_settings(header_type)
+    buffer_pool = BufferPool(settings.BYTES_CHUNK_SIZE)
+    reader, writer = socket.socketpair()
+    with reader, writer:
+        reader.setblocking(False)
+        worker = GeneratorWorker(reader, settings=settings, buffer_pool=buffer_pool)
+        task = worker.get_next_message()
+        next(task)
+        # nothing received yet, idle worker holds no pooled buffer
+        assert buffer_pool.pooled_count == 1
+
+        with pytest.raises(StopIteration):
+            for byte in make_message({'n': 1}, settings):
+                writer.send(bytes([byte]))
+                next(task)
+                next(task)
+        assert worker.get_message_and_clear() == {'n': 1}
+
+
+@pytest.mark.parametrize('worker_cls, receive', [
+    (Worker, Worker.get_next_message),
+    (GeneratorWorker, receive_with_generator_worker),
+])
+def test_announced_length_over_limit_is_rejected_before_allocating(worker_cls, receive):
+    settings = TcpSettings(server_address='127.0.0.1', max_message_size=1024)
+    reader, writer = socket.socketpair()
+    with reader, writer:
+        worker = worker_cls(reader, settings=settings)
+        writer.sendall(b'99999999999\r\n\r\n')
+
+        with pytest.raises(MessageExceedsMaxSize):
+            receive(worker)